@@ -1,9 +1,75 @@
-from envbash import load_envbash
+import hashlib
+import json
 import os
+import re
 import fishproviz
 
+
+def get_env_key(env_file):
+    """
+    hash of env_file and of the values of the environment variables it references,
+    None if env_file runs commands or sources other files, their output can not be kept in a snapshot
+    """
+    with open(env_file, "r") as f:
+        text = f.read()
+    if re.search(r"\$\((?!\()|`|(^|[;&|]\s*)(source|\.)\s", text, flags=re.MULTILINE):
+        return None
+    names = set(re.findall(r"\$\{?([A-Za-z_]\w*)", text))
+    for expression in re.findall(r"\$\(\((.*?)\)\)", text):  # arithmetic names without $
+        names.update(re.findall(r"[A-Za-z_]\w*", expression))
+    environ = sorted((k, os.environ.get(k)) for k in names)
+    return hashlib.sha1(
+        json.dumps([os.path.abspath(env_file), text, environ]).encode()
+    ).hexdigest()
+
+
+def load_config_env(env_file, snapshot_file):
+    """
+    loads the variables of env_file into os.environ as load_envbash, without overriding set variables.
+    Sourcing the file with bash takes most of the import time, the sourced variables are kept in snapshot_file
+    and reused until env_file or a variable it references changes, FISHPROVIZ_CONFIG_SNAPSHOT=0 always sources the file
+    """
+    key = None
+    if os.environ.get("FISHPROVIZ_CONFIG_SNAPSHOT", "1") != "0":
+        try:
+            key = get_env_key(env_file)
+            with open(snapshot_file, "r") as f:
+                snapshot = json.load(f)
+            if key is not None and snapshot["key"] == key:
+                for k, v in snapshot["variables"].items():
+                    os.environ.setdefault(k, v)
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+    from envbash import load_envbash
+
+    loaded = dict()
+    load_envbash(env_file, into=loaded)
+    for k, v in loaded.items():
+        os.environ.setdefault(k, v)
+    if key is None:
+        return
+    # the variables of env_file, also the ones already set in this run, and the ones bash changed,
+    # without copying the rest of the environment into the snapshot
+    with open(env_file, "r") as f:
+        text = f.read()
+    variables = {
+        k: v
+        for k, v in loaded.items()
+        if os.environ.get(k) != v or re.search(r"\b%s=" % re.escape(k), text)
+    }
+    snapshot = dict(key=key, variables=variables)
+    tmp_file = "%s.%d.tmp" % (snapshot_file, os.getpid())
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_file, snapshot_file)
+    except OSError:
+        pass  # read-only installation, the file is sourced on every import
+
+
 module_path = os.path.dirname(fishproviz.__file__)
-load_envbash(module_path + "/config.env")
+load_config_env(module_path + "/config.env", module_path + "/config.env.snapshot.json")
 # THRESHOLDS for the data set filtered for erroneous frames
 SPIKE_THRESHOLD = int(os.environ["SPIKE_THRESHOLD"])
 DIRT_THRESHOLD = int(os.environ["DIRT_THRESHOLD"])
@@ -11,6 +77,9 @@ THRESHOLD_AREA_PX = int(os.environ["THRESHOLD_AREA_PX"])
 # FILTERING
 AREA_FILTER = int(os.environ["AREA_FILTER"])  # 1 to filter by area, 0 to not filter
 DIRT_FILTER = int(os.environ["DIRT_FILTER"])  # 1 to filter by dirt, 0 to not filter
+DISTANCE_GRID = int(os.environ.get("DISTANCE_GRID", 0))  # 1 to look up the wall distances in a cached distance grid of the area, 0 to compute them exactly
+DISTANCE_GRID_RESOLUTION = float(os.environ.get("DISTANCE_GRID_RESOLUTION", 2.0))  # pixels per cell of the distance grid
+ENTROPY_DEBUG_PLOTS = int(os.environ.get("ENTROPY_DEBUG_PLOTS", 0))  # 1 to print and plot the points dropped by the entropy per interval
 ROOT = os.environ["rootserver"]
 DIR_CSV = os.environ["path_csv"]
 DIR_CSV_LOCAL = os.environ["path_csv_local"]
@@ -67,9 +136,24 @@ CALIBRATION_DIST_CM = float(os.environ["CALIBRATION_DIST_CM"])
 DEFAULT_CALIBRATION = float(os.environ["DEFAULT_CALIBRATION"])
 err_file = f"{RESULTS_PATH}/log_error.csv"
 
+# CACHE
+BATCH_CACHE = int(os.environ.get("BATCH_CACHE", 1))  # 1 to cache parsed batch csv files, 0 to always parse the csv
+STATS_STORE = int(os.environ.get("STATS_STORE", 1))  # 1 to store the metric statistics per STATS_BASE_INTERVAL and merge them to coarser intervals
+STATS_BASE_INTERVAL = int(os.environ.get("STATS_BASE_INTERVAL", 10))  # seconds, time intervals that are a multiple of it are merged from the store
+CACHE_DIR = f"{DIR_CSV_LOCAL}/" + os.environ.get("CACHE_DIR", "cache")
+ARCHIVE_DIR = f"{DIR_CSV_LOCAL}/" + os.environ.get("ARCHIVE_DIR", "archive")
+# LOADING
+INPUT_BACKEND = os.environ.get("INPUT_BACKEND", "csv")  # csv, npz to read the NNNNNN.npz files of the tracker or archive to read ARCHIVE_DIR
+LOAD_THREADS = int(os.environ.get("LOAD_THREADS", 1))  # number of threads to read the batch files of a day, 1 to read them sequentially
+PREFETCH_DEPTH = int(os.environ.get("PREFETCH_DEPTH", 1))  # number of days loaded ahead while the current day is processed, 0 to disable
+PREFETCH_MAX_MB = int(os.environ.get("PREFETCH_MAX_MB", 2048))  # memory cap in MB for the days loaded ahead
+WORKERS = int(os.environ.get("WORKERS", 1))  # number of processes to compute the metrics of the fish-days, 1 to compute them in this process
+KERNEL_THREADS = int(os.environ.get("KERNEL_THREADS", 1))  # OpenMP threads of the compiled per-frame kernels, needs a build with FISHPROVIZ_OPENMP=1
+COMPACT_DTYPES = int(os.environ.get("COMPACT_DTYPES", 0))  # 1 to keep the positions of a day as float32 and the frames as int32, 0 for float64 and int64
+
 
 def set_config_paths(root):
-    global DIR_CSV_LOCAL, CONFIG_DATA, VIS_DIR, PLOTS_DIR, RESULTS_PATH, err_file, TEX_DIR
+    global DIR_CSV_LOCAL, CONFIG_DATA, VIS_DIR, PLOTS_DIR, RESULTS_PATH, err_file, TEX_DIR, CACHE_DIR, ARCHIVE_DIR
     DIR_CSV_LOCAL = f"{root}"
     CONFIG_DATA = f"{root}/" + os.environ["CONFIG_DATA"]
     VIS_DIR = f"{root}/" + os.environ["VIS_DIR"]
@@ -77,6 +161,22 @@ def set_config_paths(root):
     RESULTS_PATH = f"{root}/" + os.environ["RESULTS"]
     err_file = f"{RESULTS_PATH}/log_error.csv"
     TEX_DIR = f"{PLOTS_DIR}/" + os.environ["TEX_DIR"]
+    CACHE_DIR = f"{root}/" + os.environ.get("CACHE_DIR", "cache")
+    ARCHIVE_DIR = f"{root}/" + os.environ.get("ARCHIVE_DIR", "archive")
+
+
+def config_state():
+    """returns the configuration values of this process, to start worker processes with the same configuration via restore_config"""
+    return {
+        k: v
+        for k, v in globals().items()
+        if not k.startswith("_") and isinstance(v, (int, float, str, list, tuple, dict))
+    }
+
+
+def restore_config(state):
+    """sets the configuration values of config_state, including the ones set at runtime e.g. from the command line"""
+    globals().update(state)
 
 
 def create_directories():
@@ -3,7 +3,8 @@ import cython
 # tag: numpy
 # You can ignore the previous line.
 # It's for internal testing of the cython documentation.
-from libc.math cimport acos, sqrt, ceil
+from libc.math cimport acos, atan2, sqrt, ceil, fabs, isfinite, INFINITY, NAN
+from cython.parallel cimport prange
 
 import numpy as np
 
@@ -28,40 +29,114 @@ DTYPE = int
 # type with a _t-suffix.
 ctypedef np.int_t DTYPE_t
 ctypedef np.float64_t double
+# positions of the kernels, float with COMPACT_DTYPES, computed in double
+ctypedef fused real:
+    float
+    double
 cdef int NDIM = 3
 
 cdef double norm(double v0, double v1):
     return sqrt(v0**2 + v1**2)
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
 cpdef np.ndarray[double, ndim=1] calc_steps(np.ndarray[double, ndim=2] data):
-    sq = (data[1:] - data[:-1])**2
-    c=np.sqrt(sq[:,0] + sq[:,1])
+    cdef const double[:, :] view = data
+    cdef np.ndarray[double, ndim=1] c = np.empty(max(data.shape[0] - 1, 0))
+    cdef double[:] steps = c
+    cdef Py_ssize_t i
+    cdef double dx, dy
+    for i in range(steps.shape[0]):
+        dx = view[i + 1, 0] - view[i, 0]
+        dy = view[i + 1, 1] - view[i, 1]
+        steps[i] = sqrt(dx * dx + dy * dy)
     return c
 
-cpdef np.ndarray[double, ndim=1] tortuosity_of_chunk(np.ndarray[double, ndim=2] data):
-    cdef int dist_length = 10 # normed by 10cm of distance traveled
-    cdef np.ndarray[double, ndim=1] steps = calc_steps(data)
-    cdef np.ndarray[double, ndim=1] c_steps = np.cumsum(steps)  # cumulative sum
-    cdef list t_result = []
-    cdef double L, C, curr_c
-    cdef int i = 0
-    cdef int j = 0
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef Py_ssize_t tortuosity_segments(const real[:, :] data, Py_ssize_t start, Py_ssize_t size, double[:] out) nogil:
+    """
+    writes the tortuosity of the segments of data[start:start+size] to out[start:], a segment ends after 10cm of distance traveled
+    returns the number of segments
+    """
+    cdef double dist_length = 10 # normed by 10cm of distance traveled
     cdef double min_L = 0.1
-    curr_c = 0 # start with 0
-    while i < c_steps.size-2:
-        while j < c_steps.size-1 and c_steps[j]-curr_c < dist_length:
-            j+=1
-        L = np.sqrt(sum((data[j+1]-data[i])**2))
-        C = c_steps[j] - curr_c
-        if L < min_L: L=min_L
-        if C < min_L: C=min_L
-        if L > C: L=C
-        t_result.append(C/L)
-        curr_c = c_steps[j]
-        i=j+1
-        j=i
-
-    return np.array(t_result, dtype=float)
+    cdef Py_ssize_t n_steps = size - 1
+    cdef Py_ssize_t i = 0, j = 0, n = 0
+    cdef double L, C, dx, dy, curr_c = 0 # start with 0
+    cdef double c_j # cumulative distance of the steps 0..j
+    if n_steps < 3:
+        return 0
+    dx = data[start + 1, 0] - data[start, 0]
+    dy = data[start + 1, 1] - data[start, 1]
+    c_j = sqrt(dx * dx + dy * dy)
+    while i < n_steps - 2:
+        while j < n_steps - 1 and c_j - curr_c < dist_length:
+            j += 1
+            dx = data[start + j + 1, 0] - data[start + j, 0]
+            dy = data[start + j + 1, 1] - data[start + j, 1]
+            c_j = c_j + sqrt(dx * dx + dy * dy)
+        dx = data[start + j + 1, 0] - data[start + i, 0]
+        dy = data[start + j + 1, 1] - data[start + i, 1]
+        L = sqrt(dx * dx + dy * dy)
+        C = c_j - curr_c
+        if L < min_L: L = min_L
+        if C < min_L: C = min_L
+        if L > C: L = C
+        out[start + n] = C / L
+        n += 1
+        curr_c = c_j
+        i = j + 1
+        j = i
+        if i < n_steps - 2:
+            dx = data[start + j + 1, 0] - data[start + j, 0]
+            dy = data[start + j + 1, 1] - data[start + j, 1]
+            c_j = c_j + sqrt(dx * dx + dy * dy)
+    return n
+
+cpdef np.ndarray[double, ndim=1] tortuosity_of_chunk(np.ndarray[double, ndim=2] data):
+    cdef const double[:, :] view = data
+    cdef np.ndarray[double, ndim=1] t_result = np.empty(data.shape[0])
+    cdef double[:] out = t_result
+    cdef Py_ssize_t n
+    with nogil:
+        n = tortuosity_segments(view, 0, view.shape[0], out)
+    return t_result[:n]
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def tortuosity_of_intervals(const real[:, :] data, const np.int64_t[:] starts, const np.int64_t[:] counts, int threads=1):
+    """
+    @params: data (Nx2) valid points, starts, counts of the contiguous intervals in data, threads for the intervals
+    returns Mx3 (mean, std, n) of the tortuosity of every interval as mean_std(tortuosity_of_chunk(interval)),
+    with the number of points n of the interval
+    """
+    cdef Py_ssize_t n_intervals = starts.shape[0]
+    result_array = np.empty((n_intervals, 3))
+    cdef double[:, :] result = result_array
+    # the segments of an interval are written at the start of the interval, so the intervals do not overlap
+    cdef double[:] segments = np.empty(max(data.shape[0], 1))
+    cdef Py_ssize_t k, s, n
+    cdef double total, mean, sq
+    for k in prange(n_intervals, nogil=True, num_threads=threads, schedule="dynamic"):
+        n = tortuosity_segments(data, starts[k], counts[k], segments)
+        result[k, 2] = counts[k]
+        if n == 0:
+            result[k, 0] = NAN
+            result[k, 1] = NAN
+        else:
+            total = 0
+            for s in range(starts[k], starts[k] + n):
+                total = total + segments[s]
+            mean = total / n
+            sq = 0
+            for s in range(starts[k], starts[k] + n):
+                sq = sq + (segments[s] - mean) * (segments[s] - mean)
+            result[k, 0] = mean
+            result[k, 1] = sqrt(sq / n)
+    return result_array
 
 cpdef (double, double) mean_std(np.ndarray[double, ndim=1] data):
     if data.size == 0:
@@ -71,18 +146,129 @@ cpdef (double, double) mean_std(np.ndarray[double, ndim=1] data):
     std = sqrt(((data-mean)**2).sum()/data.size)
     return (mean, std)
 
+#### KINEMATICS --------------
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def kinematics(const real[:, :] data, const np.uint8_t[:] filter_index, double spike_threshold):
+    """
+    @params: data (Nx2) points in cm, filter_index (N) points to filter, spike_threshold in cm
+    One pass over the points, returns
+    steps (N-1) step lengths as compute_step_lengths,
+    angles (N-2) signed turning angles as compute_turning_angles,
+    spikes (N-1) steps longer than spike_threshold,
+    error_two (N-1) and error_three (N-2) error masks as update_filter_two_points and update_filter_three_points
+    """
+    cdef Py_ssize_t n = data.shape[0]
+    cdef Py_ssize_t n_steps = max(n - 1, 0), n_angles = max(n - 2, 0)
+    steps_array = np.empty(n_steps)
+    angles_array = np.zeros(n_angles)
+    spikes_array = np.zeros(n_steps, dtype=np.uint8)
+    error_two_array = np.zeros(n_steps, dtype=np.uint8)
+    error_three_array = np.zeros(n_angles, dtype=np.uint8)
+    cdef double[:] steps = steps_array
+    cdef double[:] angles = angles_array
+    cdef np.uint8_t[:] spikes = spikes_array
+    cdef np.uint8_t[:] error_two = error_two_array
+    cdef np.uint8_t[:] error_three = error_three_array
+    cdef Py_ssize_t k
+    cdef double dx, dy, px = 0, py = 0
+    cdef bint has_previous = False
+    with nogil:
+        for k in range(n_steps):
+            dx = data[k + 1, 0] - data[k, 0]
+            dy = data[k + 1, 1] - data[k, 1]
+            steps[k] = sqrt(dx * dx + dy * dy)
+            spikes[k] = steps[k] > spike_threshold
+            error_two[k] = filter_index[k] or filter_index[k + 1] or spikes[k]
+            if k > 0:
+                error_three[k - 1] = error_two[k - 1] or error_two[k]
+            # the angle between the last non-zero finite step and this one, zero for the skipped steps
+            if (dx != 0 or dy != 0) and isfinite(dx) and isfinite(dy):
+                if has_previous:
+                    angles[k - 1] = atan2(px * dy - py * dx, px * dx + py * dy)
+                px, py = dx, dy
+                has_previous = True
+    return (
+        steps_array,
+        angles_array,
+        spikes_array.astype(bool),
+        error_two_array.astype(bool),
+        error_three_array.astype(bool),
+    )
+
 #### DINSTANCE TO THE WALL --------------
 
-cpdef np.ndarray[double, ndim=1] distance_to_wall_chunk(np.ndarray[double, ndim=2] data, np.ndarray[double, ndim=2] area):
-    cdef int size
-    size = data.shape[0]
-    cdef np.ndarray[double, ndim=1] dists
-    cdef np.ndarray[double, ndim=2] abcn = calc_wall_lines(area)
-    #for i in range(size):
-    dists = min_distance(data, abcn)
+cpdef np.ndarray[double, ndim=1] distance_to_wall_chunk(np.ndarray[double, ndim=2] data, np.ndarray[double, ndim=2] area, int threads=1):
+    """returns the distance of every point to the closest wall line of the area"""
+    return distance_to_walls(data, wall_lines(area), threads)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def distance_to_walls(const real[:, :] data, const double[:, :] abcn, int threads=1, const np.uint8_t[:] select=None):
+    """
+    @params: data (Nx2), abcn wall lines of wall_lines(area), threads, select (N) optional points to compute
+    returns the distance of every point to the closest wall line, streamed per point without a walls x points matrix,
+    NaN for the points not selected
+    """
+    cdef Py_ssize_t n = data.shape[0]
+    dists = np.empty(n)
+    cdef double[:] out = dists
+    cdef Py_ssize_t i, w
+    cdef Py_ssize_t n_walls = abcn.shape[0]
+    cdef bint has_select = select is not None
+    cdef double d, best
+    if has_select and select.shape[0] != n:
+        raise ValueError("select has %d entries for %d points" % (select.shape[0], n))
+    for i in prange(n, nogil=True, num_threads=threads, schedule="static"):
+        if has_select and not select[i]:
+            out[i] = NAN
+        else:
+            best = INFINITY
+            for w in range(n_walls):
+                d = fabs(abcn[w, 0] * data[i, 0] + abcn[w, 1] * data[i, 1] + abcn[w, 2]) / abcn[w, 3]
+                if d < best or d != d:
+                    best = d
+            out[i] = best
     return dists
 
-cdef np.ndarray[double, ndim=2] calc_wall_lines(np.ndarray[double, ndim=2] area):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def grid_lookup(const real[:, :] data, const float[:, :] grid, double origin_x, double origin_y, double resolution, int threads=1, const np.uint8_t[:] select=None):
+    """
+    @params: data (Nx2), grid (nx, ny) values at (origin_x + i * resolution, origin_y + j * resolution), threads,
+    select (N) optional points to look up
+    returns the bilinear interpolation of the grid at every point, NaN for the points outside of the grid or not selected
+    """
+    cdef Py_ssize_t n = data.shape[0]
+    values = np.empty(n)
+    cdef double[:] out = values
+    cdef Py_ssize_t nx = grid.shape[0], ny = grid.shape[1]
+    cdef Py_ssize_t i, ix, iy
+    cdef double gx, gy, fx, fy
+    cdef bint has_select = select is not None
+    if has_select and select.shape[0] != n:
+        raise ValueError("select has %d entries for %d points" % (select.shape[0], n))
+    for i in prange(n, nogil=True, num_threads=threads, schedule="static"):
+        gx = (data[i, 0] - origin_x) / resolution
+        gy = (data[i, 1] - origin_y) / resolution
+        if (has_select and not select[i]) or not (gx >= 0 and gy >= 0 and gx < nx - 1 and gy < ny - 1):
+            out[i] = NAN
+        else:
+            ix = <Py_ssize_t>gx
+            iy = <Py_ssize_t>gy
+            fx = gx - ix
+            fy = gy - iy
+            out[i] = (
+                (1 - fx) * ((1 - fy) * grid[ix, iy] + fy * grid[ix, iy + 1])
+                + fx * ((1 - fy) * grid[ix + 1, iy] + fy * grid[ix + 1, iy + 1])
+            )
+    return values
+
+cpdef np.ndarray[double, ndim=2] wall_lines(np.ndarray[double, ndim=2] area):
+    """returns the coefficients a, b, c and norm(a, b) of the line ax + by + c = 0 through every wall of the area"""
     cdef np.ndarray[double, ndim=2] abcn = np.zeros((area.shape[0], 4))
     cdef int i
     cdef int size = area.shape[0]
@@ -96,15 +282,77 @@ cdef np.ndarray[double, ndim=2] calc_wall_lines(np.ndarray[double, ndim=2] area)
         abcn[i,3]=norm(v2,v1) # norm(a,b)
     return abcn
 
-cdef np.ndarray[double, ndim=1] min_distance(np.ndarray[double, ndim=2] data, np.ndarray[double, ndim=2] abcn):
-    cdef np.ndarray[double, ndim=2] min_dists
-    min_dists = distance_to_line(data[:,0], data[:,1], abcn[:,0], abcn[:,1], abcn[:,2], abcn[:,3])
-    return np.min(min_dists, axis=0)
-
-cdef np.ndarray[double, ndim=2] distance_to_line(
-    np.ndarray[double, ndim=1] x,
-    np.ndarray[double, ndim=1] y,
-    np.ndarray[double, ndim=1] a,
-    np.ndarray[double, ndim=1] b, np.ndarray[double, ndim=1] c,
-    np.ndarray[double, ndim=1] n):
-    return np.abs(a[:,np.newaxis]*x+b[:,np.newaxis]*y+c[:,np.newaxis])/n[:,np.newaxis]
+#### TRACKER CSV PARSING --------------
+
+from libc.stdlib cimport strtod
+from libc.string cimport memchr
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def parse_batch_columns(bytes buf, Py_ssize_t start, np.ndarray[np.int64_t, ndim=1] column_idx, int ix=-1, int iy=-1, bint drop_errors=False):
+    """
+    Parses the semicolon separated rows of buf from the offset start, only the columns column_idx are converted.
+    Rows with an empty or non numeric value in one of these columns are skipped (e.g. 2;80.000000;;;;...).
+    ix, iy: positions of xpx, ypx in column_idx to flag default points (-1,-1) and (0,0) as errors,
+    with drop_errors these rows are skipped as well, except the last row which records the last frame.
+    returns values (N x len(column_idx)), errors (N)
+    """
+    cdef const char* s = buf
+    cdef const char* q
+    cdef char* endp
+    cdef Py_ssize_t length = len(buf)
+    cdef Py_ssize_t pos = start, p, line_end, n = 0
+    cdef int n_cols = column_idx.shape[0]
+    cdef int max_col = column_idx.max()
+    cdef int field, j
+    cdef bint ok, is_error
+    cdef double v
+    cdef np.int64_t[:] col_map = np.full(max_col + 1, -1, dtype=np.int64)
+    for j in range(n_cols):
+        col_map[column_idx[j]] = j
+    cdef Py_ssize_t n_rows_max = buf.count(b"\n", start) + 1
+    values_array = np.empty((n_rows_max, n_cols))
+    errors_array = np.zeros(n_rows_max, dtype=np.uint8)
+    cdef double[:, :] values = values_array
+    cdef np.uint8_t[:] errors = errors_array
+    cdef double[:] row = np.empty(n_cols)
+
+    with nogil:  # other threads can read the next file meanwhile
+        while pos < length:
+            q = <const char*>memchr(s + pos, b"\n", length - pos)
+            line_end = length if q == NULL else q - s
+            ok = line_end > pos
+            p = pos
+            field = 0
+            while ok and field <= max_col:
+                j = col_map[field]
+                if j >= 0:
+                    if p >= line_end or s[p] == b";" or s[p] == b"\r":
+                        ok = False  # empty field
+                        break
+                    v = strtod(s + p, &endp)
+                    if endp == s + p or v != v or endp - s > line_end or (
+                        endp - s < line_end and endp[0] != b";" and endp[0] != b"\r"
+                    ):
+                        ok = False  # not a number
+                        break
+                    row[j] = v
+                    p = endp - s
+                if field < max_col:
+                    q = <const char*>memchr(s + p, b";", line_end - p)
+                    if q == NULL:
+                        ok = False  # too few fields
+                        break
+                    p = q - s + 1
+                field += 1
+            if ok:
+                if drop_errors and n > 0 and errors[n - 1]:
+                    n -= 1  # overwrite the previous erroneous row, it was not the last one
+                for j in range(n_cols):
+                    values[n, j] = row[j]
+                if ix >= 0 and iy >= 0:
+                    is_error = (row[ix] == -1 and row[iy] == -1) or (row[ix] == 0 and row[iy] == 0)
+                    errors[n] = is_error
+                n += 1
+            pos = line_end + 1
+    return values_array[:n], errors_array[:n].astype(bool)
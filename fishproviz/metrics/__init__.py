@@ -1,5 +1,7 @@
 from .metrics import (
     metric_per_interval,
+    metrics_per_interval,
+    all_metrics_per_interval,
     activity_per_interval,
     tortuosity_per_interval,
     turning_angle_per_interval,
@@ -9,6 +11,7 @@ from .metrics import (
     distance_to_wall_per_interval,
     distance_to_wall,
     num_of_spikes,
+    compute_kinematics,
     get_gaps_in_dataframes,
     activity_mean_sd,
     activity,
@@ -43,6 +46,8 @@ metric_names = [
 
 __all__ = [
     "metric_per_interval",
+    "metrics_per_interval",
+    "all_metrics_per_interval",
     "activity_per_interval",
     "tortuosity_per_interval",
     "turning_angle_per_interval",
@@ -55,6 +60,7 @@ __all__ = [
     "metric_result_to_csv",
     "num_of_spikes",
     "compute_step_lengths",
+    "compute_kinematics",
     "get_gaps_in_dataframes",
     "activity_mean_sd",
     "activity",
@@ -1,8 +1,7 @@
 import numpy as np
 import pandas as pd
-import scipy.stats as scipy_stats
-import matplotlib.pyplot as plt
 import fishproviz.config as config
+from .diagnostics import plot_dropped_points
 
 
 def compute_step_lengths(points):
@@ -62,6 +61,8 @@ def entropy_for_chunk(chunk, area_tuple):
     area = tuple(fish_key, data)
     retrun entropy
     """
+    import scipy.stats as scipy_stats
+
     if chunk.shape[0] == 0:
         return np.nan
     fish_key, area = area_tuple
@@ -73,31 +74,27 @@ def entropy_for_chunk(chunk, area_tuple):
     else:  # if front the lower triangle +3
         tri = np.tril_indices(l_y, k=3)
     sum_hist = np.sum(hist)
-    if sum_hist == 0:  #
-        # print(chunk[:10])
-        print(
-            "Warning for %s all %d data points were not in der range of histogram and removed"
-            % (fish_key, chunk.shape[0])
-        )
+    if sum_hist == 0:
+        if config.ENTROPY_DEBUG_PLOTS:
+            print(
+                "Warning for %s all %d data points were not in der range of histogram and removed"
+                % (fish_key, chunk.shape[0])
+            )
         return np.nan
-    if chunk.shape[0] > sum_hist:
-        # print(chunk[:10])
-        print(
-            "Warning for %s %d out of %d data points were not in der range of histogram and removed"
-            % (fish_key, chunk.shape[0] - sum_hist, chunk.shape[0])
-        )
-    if sum_hist > np.sum(hist[tri]):
-        print(
-            "Warning for %s the selected area for entropy has lost some points: "
-            % fish_key,
-            "sum hist: ",
-            np.sum(hist),
-            "sum selection: ",
-            sum(hist[tri]),
-            "\n",
-            fish_key,
-        )
-        print("entropy: ", scipy_stats.entropy(hist[tri]))
-        plt.plot(*area.T)
-        plt.plot(*chunk.T, "*")
+    if config.ENTROPY_DEBUG_PLOTS:  # the dropped points of the metrics are reported by diagnostics
+        if chunk.shape[0] > sum_hist:
+            print(
+                "Warning for %s %d out of %d data points were not in der range of histogram and removed"
+                % (fish_key, chunk.shape[0] - sum_hist, chunk.shape[0])
+            )
+        if sum_hist > np.sum(hist[tri]):
+            print(
+                "Warning for %s the selected area for entropy has lost some points: "
+                % fish_key,
+                "sum hist: ",
+                np.sum(hist),
+                "sum selection: ",
+                sum(hist[tri]),
+            )
+            plot_dropped_points(area, chunk)
     return scipy_stats.entropy(hist[tri])
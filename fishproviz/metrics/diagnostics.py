@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import fishproviz.config as config
+
+DROPPED_POINTS_COLUMNS = [
+    "cam_pos",
+    "day",
+    "interval",
+    "num_valid_points",
+    "out_of_range",
+    "out_of_compartment",
+]
+
+_dropped_points = []
+
+
+def record_dropped_points(fish_key, day, counts, histogram_sums, compartment_sums):
+    """
+    @params: fish_key, day, per interval: counts -- valid points, histogram_sums -- points in the histogram range,
+    compartment_sums -- points in the compartment of the fish
+    collects the intervals of the entropy where points were dropped, reported by report_dropped_points
+    """
+    out_of_range = counts - histogram_sums
+    out_of_compartment = histogram_sums - compartment_sums
+    intervals = np.flatnonzero((out_of_range > 0) | (out_of_compartment > 0))
+    for i in intervals:
+        _dropped_points.append(
+            (
+                fish_key,
+                day,
+                int(i),
+                int(counts[i]),
+                int(out_of_range[i]),
+                int(out_of_compartment[i]),
+            )
+        )
+
+
+def pop_dropped_points():
+    """returns and clears the collected records, to pass them from a worker process to the main process"""
+    records = list(_dropped_points)
+    _dropped_points.clear()
+    return records
+
+
+def extend_dropped_points(records):
+    _dropped_points.extend(records)
+
+
+def report_dropped_points(filename=None):
+    """prints a summary of the dropped entropy points per fish, writes them to filename if given and clears them"""
+    records = pop_dropped_points()
+    if len(records) == 0:
+        return None
+    df = pd.DataFrame(records, columns=DROPPED_POINTS_COLUMNS)
+    for fish_key, df_fish in df.groupby("cam_pos", sort=False):
+        print(
+            "Warning for %s entropy: %d points out of the histogram range and %d points outside of the compartment in %d intervals of %d days"
+            % (
+                fish_key,
+                df_fish["out_of_range"].sum(),
+                df_fish["out_of_compartment"].sum(),
+                len(df_fish),
+                df_fish["day"].nunique(),
+            )
+        )
+    if filename is not None:
+        df.to_csv(filename, sep=config.sep)
+        print("dropped entropy points written to %s" % filename)
+    return df
+
+
+def plot_dropped_points(area, chunk):
+    """debug plot of the area and the points of an interval with dropped points, enabled by ENTROPY_DEBUG_PLOTS"""
+    import matplotlib.pyplot as plt
+
+    plt.plot(*area.T)
+    plt.plot(*chunk.T, "*")
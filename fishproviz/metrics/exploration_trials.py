@@ -3,11 +3,12 @@ import fishproviz.config as config
 from fishproviz.utils import (
     get_days_in_order,
     get_camera_pos_keys,
-    csv_of_the_day,
     get_seconds_from_time,
     start_time_of_day_to_seconds,
 )
-from fishproviz.utils.transformation import pixel_to_cm
+from fishproviz.utils.day_store import load_day
+from fishproviz.utils.prefetch import prefetch
+from fishproviz.utils.transformation import get_transform
 from fishproviz.metrics import activity
 from fishproviz.utils.error_filter import error_default_points
 import pandas as pd
@@ -33,36 +34,45 @@ def exploration_trials(path_trials=config.TRIAL_TIMES_CSV):
     subcols = ["mean", "std", "n_df"]
     # pd.DataFrame(None, tdf.index, pd.MultiIndex.from_product([get_camera_pos_keys(), ["mean", "std", "n_df"]]))
     tdf_b = tdf[int(BLOCK[-1]) == tdf["block"]]
-    for fk in get_camera_pos_keys():
+    work_items = [
+        (fk, d)
+        for fk in get_camera_pos_keys()
+        for d in get_days_in_order(
+            camera=fk.split("_")[0], is_back=config.BACK == fk.split("_")[1]
+        )
+    ]
+
+    def load(item):
+        fk, d = item
         cam, pos = fk.split("_")
-        for d in get_days_in_order(camera=cam, is_back=config.BACK == pos):
-            keys, df_days = csv_of_the_day(
-                camera=cam, day=d, is_back=config.BACK == pos
+        return load_day(camera=cam, day=d, is_back=config.BACK == pos)
+
+    # the next day is loaded while the activity of the current one is computed
+    for (fk, d), (keys, frames, positions) in prefetch(work_items, load):
+        daystr, daytime = d.split("_")
+        daytime_DF = (
+            start_time_of_day_to_seconds(daytime) * config.FRAMES_PER_SECOND
+        )
+        frames = frames + daytime_DF
+        if len(keys) > 0:
+            date = ".".join([daystr[6:8], daystr[4:6], daystr[2:4]])
+            start, end = tdf_b[tdf_b["date"] == date][
+                ["trial_start", "trial_end"]
+            ].to_numpy()[0]
+            s, e = (
+                get_seconds_from_time(start) * config.FRAMES_PER_SECOND,
+                get_seconds_from_time(end) * config.FRAMES_PER_SECOND,
             )
-            daystr, daytime = d.split("_")
-            daytime_DF = (
-                start_time_of_day_to_seconds(daytime) * config.FRAMES_PER_SECOND
+            in_trial = (frames >= s) & (frames <= e)
+            data = positions[in_trial]
+            err_filter = error_default_points(data)
+            act = activity(
+                get_transform(fk).to_cm(positions, select=in_trial),
+                data.shape[0],
+                err_filter,
             )
-            for k, df in zip(keys, df_days):
-                df.index = df.FRAME + (int(k) * config.BATCH_SIZE) + daytime_DF
-            if len(keys) > 0:
-                df_d = pd.concat(df_days)
-                date = ".".join([daystr[6:8], daystr[4:6], daystr[2:4]])
-                start, end = tdf_b[tdf_b["date"] == date][
-                    ["trial_start", "trial_end"]
-                ].to_numpy()[0]
-                s, e = (
-                    get_seconds_from_time(start) * config.FRAMES_PER_SECOND,
-                    get_seconds_from_time(end) * config.FRAMES_PER_SECOND,
-                )
-                trial_df = df_d[(df_d.index >= s) & (df_d.index <= e)]
-                data = trial_df[["xpx", "ypx"]].to_numpy()
-                err_filter = error_default_points(data)
-                act = activity(
-                    pixel_to_cm(data, fish_key=fk), data.shape[0], err_filter
-                )
-                tdf.loc[tdf["date"] == date, fk] = act[0][0]
-                tdf_ndf.loc[tdf["date"] == date, fk] = act[0][2]
+            tdf.loc[tdf["date"] == date, fk] = act[0][0]
+            tdf_ndf.loc[tdf["date"] == date, fk] = act[0][2]
 
     tdf.to_csv(res_mean, sep=config.sep, index=False)
     tdf_ndf.to_csv(res_ndf, sep=config.sep, index=False)
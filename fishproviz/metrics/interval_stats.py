@@ -0,0 +1,169 @@
+import functools
+import numpy as np
+import fishproviz.config as config
+from .diagnostics import record_dropped_points
+
+# columns of the moment statistics of an interval
+N, SUM, M2, MIN, MAX = range(5)
+
+
+def segment_sums(values, starts, counts, ufunc=np.add, empty=0):
+    """reduction of the contiguous segments values[starts[i]:starts[i] + counts[i]], empty for empty segments"""
+    sums = np.full((starts.shape[0], *values.shape[1:]), empty, dtype=values.dtype)
+    non_empty = counts > 0
+    if np.any(non_empty):
+        sums[non_empty] = ufunc.reduceat(values, starts[non_empty], axis=0)
+    return sums
+
+
+def valid_segments(values, split_index, error_index):
+    """
+    @params: values (N,...), split_index as for np.split, error_index (N)
+    returns the valid values and the start and count of every interval in them,
+    the intervals are contiguous after removing the errors
+    """
+    size = values.shape[0]
+    bounds = np.clip(np.concatenate([[0], split_index, [size]]), 0, size).astype(np.int64)
+    valid_index = np.flatnonzero(~error_index)
+    valid_before = np.searchsorted(valid_index, bounds)
+    return values[valid_index], valid_before[:-1], np.diff(valid_before)
+
+
+def interval_moments(values, split_index, error_index):
+    """
+    returns Mx5 mergeable statistics (n, sum, sum of squared deviations, min, max) of the valid values of every interval
+    """
+    valid_values, starts, counts = valid_segments(values, split_index, error_index)
+    moments = np.empty((starts.shape[0], 5))
+    moments[:, N] = counts
+    moments[:, SUM] = segment_sums(valid_values, starts, counts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        deviation = valid_values - np.repeat(moments[:, SUM] / counts, counts)
+    moments[:, M2] = segment_sums(deviation * deviation, starts, counts)
+    moments[:, MIN] = segment_sums(valid_values, starts, counts, np.minimum, np.inf)
+    moments[:, MAX] = segment_sums(valid_values, starts, counts, np.maximum, -np.inf)
+    return moments
+
+
+def merge_moments(moments, ratio):
+    """merges every ratio consecutive intervals, the last interval may merge fewer"""
+    starts = np.arange(0, moments.shape[0], ratio)
+    counts = np.diff(np.append(starts, moments.shape[0]))
+    merged = np.empty((starts.shape[0], 5))
+    merged[:, N] = np.add.reduceat(moments[:, N], starts)
+    merged[:, SUM] = np.add.reduceat(moments[:, SUM], starts)
+    merged[:, MIN] = np.minimum.reduceat(moments[:, MIN], starts)
+    merged[:, MAX] = np.maximum.reduceat(moments[:, MAX], starts)
+    n = moments[:, N]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # parallel variance: the deviations of the interval means to the merged mean
+        delta = moments[:, SUM] / n - np.repeat(merged[:, SUM] / merged[:, N], counts)
+        m2 = np.where(n > 0, moments[:, M2] + n * delta * delta, 0.0)
+    merged[:, M2] = np.add.reduceat(m2, starts)
+    return merged
+
+
+def moments_to_mean_std(moments):
+    """returns Mx3 (mean, std, n) as calculate_result_for_interval with mean_std"""
+    n = moments[:, N]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.column_stack(
+            [moments[:, SUM] / n, np.sqrt(moments[:, M2] / n), n]
+        )
+
+
+def histogram_edges(area, bins=(18, 18)):
+    """the bin edges of entropy_heatmap: the range of the area and THRESHOLD_AREA_PX around it"""
+    th = config.THRESHOLD_AREA_PX
+    return [
+        np.linspace(area[:, i].min() - th, area[:, i].max() + th, bins[i] + 1)
+        for i in range(2)
+    ]
+
+
+def histogram_bin_index(data, area, bins=(18, 18)):
+    """
+    returns the flat bin index of every point in the bins of entropy_heatmap, -1 for the points outside of the range,
+    the bins are assigned like np.histogram2d
+    """
+    index = np.zeros(data.shape[0], dtype=np.int64)
+    outside = np.zeros(data.shape[0], dtype=bool)
+    for i, edges in enumerate(histogram_edges(area, bins)):
+        bin_i = np.searchsorted(edges, data[:, i], side="right")
+        bin_i[data[:, i] == edges[-1]] -= 1  # the right edge is in the last bin
+        outside |= (bin_i == 0) | (bin_i > bins[i])
+        index = index * bins[i] + bin_i - 1
+    index[outside] = -1
+    return index
+
+
+def interval_histograms(data, split_index, error_index, area, bins=(18, 18)):
+    """
+    returns the entropy histograms of the valid points of every interval (Mxbins) and the number of valid points (M),
+    all intervals with one bincount over (interval, bin)
+    """
+    valid_data, starts, counts = valid_segments(data, split_index, error_index)
+    n_bins = bins[0] * bins[1]
+    bin_index = histogram_bin_index(valid_data, area, bins)
+    interval_index = np.repeat(np.arange(starts.shape[0]), counts)
+    in_range = bin_index >= 0
+    histograms = np.bincount(
+        interval_index[in_range] * n_bins + bin_index[in_range],
+        minlength=starts.shape[0] * n_bins,
+    )
+    return histograms.reshape(starts.shape[0], *bins).astype(np.int32), counts
+
+
+@functools.lru_cache(maxsize=None)
+def compartment_mask(is_back, bins=(18, 18)):
+    """
+    the bins of the compartment of the fish: the upper triangle (k=-3) for back, the lower triangle (k=3) for front,
+    k is scaled to the number of bins for other resolutions than 18x18
+    """
+    k = int(round(3 * bins[1] / 18))
+    ones = np.ones(bins, dtype=bool)
+    mask = np.triu(ones, k=-k) if is_back else np.tril(ones, k=k)
+    mask.flags.writeable = False
+    return mask
+
+
+def merge_histograms(histograms, counts, ratio):
+    starts = np.arange(0, histograms.shape[0], ratio)
+    return (
+        np.add.reduceat(histograms, starts, axis=0),
+        np.add.reduceat(counts, starts),
+    )
+
+
+def histograms_to_entropy(histograms, counts, fish_key, day=None):
+    """
+    returns Mx2 (entropy, n) as calculate_result_for_interval with entropy_for_chunk,
+    with day the dropped points of the intervals are recorded in diagnostics
+    """
+    mask = compartment_mask(config.BACK in fish_key, histograms.shape[1:])
+    selected = histograms[:, mask].astype(float)
+    histogram_sums = histograms.sum(axis=(1, 2))
+    if day is not None:
+        record_dropped_points(fish_key, day, counts, histogram_sums, selected.sum(axis=1))
+    entropies = np.full(histograms.shape[0], np.nan)
+    valid = (counts > 0) & (histogram_sums > 0)
+    if np.any(valid):
+        import scipy.stats as scipy_stats
+
+        entropies[valid] = scipy_stats.entropy(selected[valid], axis=1)
+    return np.column_stack([entropies, counts.astype(float)])
+
+
+def interval_entropies(data, split_index, error_index, area_tuple, bins_list=((18, 18),)):
+    """
+    multi-scale entropy: the entropy of every interval for every bin resolution of bins_list in one pass
+    returns Mx(len(bins_list) + 1) the entropies and the number of valid points
+    """
+    fish_key, area = area_tuple
+    results = [
+        histograms_to_entropy(
+            *interval_histograms(data, split_index, error_index, area, bins), fish_key
+        )
+        for bins in bins_list
+    ]
+    return np.column_stack([r[:, 0] for r in results] + [results[0][:, 1]])
@@ -1,26 +1,49 @@
+import multiprocessing as mp
 import fishproviz.config as config
 from fishproviz.utils import (
-    csv_of_the_day,
     get_days_in_order,
     get_fish2camera_map,
     all_error_filters,
 )
-from fishproviz.utils.tank_area_config import get_area_functions
-from fishproviz.utils.transformation import pixel_to_cm, px2cm
-from fishproviz.methods import tortuosity_of_chunk, distance_to_wall_chunk, mean_std
-from .results_to_csv import metric_result_to_csv
-from .compute_metrics import (
-    compute_step_lengths,
-    compute_turning_angles,
-    entropy_for_chunk,
+from fishproviz.utils.tank_area_config import get_area_functions, get_calibration_functions
+from fishproviz.utils.distance_grid import wall_distance
+from fishproviz.utils.day_store import load_day, advise_will_need, real_array
+from fishproviz.utils.prefetch import prefetch
+from fishproviz.utils.transformation import get_transform, px2cm
+from fishproviz.utils.utile import get_interval_name_from_seconds, init_worker, worker_initargs
+from fishproviz.methods import (
+    tortuosity_of_intervals,
+    kinematics as kinematics_kernel,
+    mean_std,
 )
+from .results_to_csv import (
+    metric_result_to_csv,
+    read_metric_result_csv,
+    get_filename_for_metric_csv,
+)
+from .diagnostics import (
+    pop_dropped_points,
+    extend_dropped_points,
+    report_dropped_points,
+    plot_dropped_points,
+)
+from .interval_stats import (
+    segment_sums,
+    valid_segments,
+    interval_moments,
+    merge_moments,
+    moments_to_mean_std,
+    interval_histograms,
+    merge_histograms,
+    histograms_to_entropy,
+    compartment_mask,
+)
+from .stats_store import get_day_fingerprint, read_day_stats, write_day_stats
 import pandas as pd
 import numpy as np
-import bisect
-
-from fishproviz.utils.utile import start_time_of_day_to_seconds
 
 NDIM = 3
+SEGMENTED_MAX_INTERVAL_LENGTH = 2000  # mean interval length in frames up to which the vectorized reduction is faster than the loop
 
 
 def num_of_spikes(steps):
@@ -41,6 +64,27 @@ def update_filter_three_points(steps, filter_index):
     return filter_index[:-1] | filter_index[1:]
 
 
+def compute_kinematics(data, filter_index):
+    """
+    @params: data (Nx2) in cm, filter_index (N)
+    returns dict of steps, angles, spikes, error_two, error_three computed in one pass over the data,
+    the same as compute_step_lengths, compute_turning_angles, get_spikes_filter,
+    update_filter_two_points and update_filter_three_points, to be shared by the metrics of a fish-day
+    """
+    steps, angles, spikes, error_two, error_three = kinematics_kernel(
+        real_array(data),
+        np.ascontiguousarray(filter_index, dtype=bool).view(np.uint8),
+        float(config.SPIKE_THRESHOLD),
+    )
+    return dict(
+        steps=steps,
+        angles=angles,
+        spikes=spikes,
+        error_two=error_two,
+        error_three=error_three,
+    )
+
+
 def activity_mean_sd(steps, error_index):
     steps = steps[~error_index]
     if len(steps) == 0:
@@ -53,7 +97,39 @@ def get_gaps_in_dataframes(frames):
     return np.where(gaps_select)[0], gaps_select
 
 
+def segmented_mean_std(values, split_index, error_index, include_median=False):
+    """
+    Vectorized calculate_result_for_interval for mean_std and mean_std_median
+    @params: values (N), split_index, error_index (N), include_median
+    returns Mx3 (mean, std, n) or Mx4 (mean, std, median, n) for the M = len(split_index) + 1 intervals
+    """
+    valid_values, starts, counts = valid_segments(values, split_index, error_index)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = segment_sums(valid_values, starts, counts) / counts
+        # two pass variance like mean_std
+        deviation = valid_values - np.repeat(mean, counts)
+        std = np.sqrt(segment_sums(deviation * deviation, starts, counts) / counts)
+    columns = [mean, std]
+    if include_median:
+        columns.append(
+            [
+                np.percentile(chunk, 50) if len(chunk) > 0 else np.nan
+                for chunk in np.split(valid_values, starts[1:])
+            ]
+        )
+    return np.column_stack([*columns, counts.astype(float)])
+
+
 def calculate_result_for_interval(data, split_index, avg_metric_f, error_index, NDIM=3):
+    if (
+        avg_metric_f in [mean_std, mean_std_median]
+        and data.ndim == 1
+        and data.shape[0] < SEGMENTED_MAX_INTERVAL_LENGTH * (len(split_index) + 1)
+    ):
+        # reducible per point statistics of many short intervals are computed for all intervals at once
+        return segmented_mean_std(
+            data, split_index, error_index, include_median=avg_metric_f is mean_std_median
+        )
     len_out = len(split_index) + 1
     mu_sd = np.zeros([len_out, NDIM], dtype=float)
     for i, (chunk, err_flt) in enumerate(
@@ -65,34 +141,41 @@ def calculate_result_for_interval(data, split_index, avg_metric_f, error_index,
     return mu_sd
 
 
-def entropy(data, frame_interval, error_index, area):
-    return calculate_result_for_interval(
-        data,
-        frame_interval,
-        lambda chunk: entropy_for_chunk(chunk, area),
-        error_index,
-        NDIM=2,
-    )
+def entropy(data, frame_interval, error_index, area, day=None):
+    # the histograms of all intervals of the day with one bincount
+    histograms, counts = interval_histograms(data, frame_interval, error_index, area[1])
+    result = histograms_to_entropy(histograms, counts, area[0], day)
+    if config.ENTROPY_DEBUG_PLOTS:
+        mask = compartment_mask(config.BACK in area[0], histograms.shape[1:])
+        for i in np.flatnonzero(counts > histograms[:, mask].sum(axis=1)):
+            chunk, err_flt = (
+                np.split(data, frame_interval)[i],
+                np.split(error_index, frame_interval)[i],
+            )
+            plot_dropped_points(area[1], chunk[~err_flt])
+    return result
 
 
-def distance_to_wall(data, frame_interval, error_index, area):
+def distance_to_wall_values(data, error_index, area):
+    """the distance is computed per point, hence for the whole day before reducing the intervals"""
     fish_key = area[0]
+    distances = px2cm(wall_distance(data, fish_key, area[1]), fish_key=fish_key)
+    return distances, error_index
+
+
+def distance_to_wall(data, frame_interval, error_index, area):
     return calculate_result_for_interval(
-        data,
+        *distance_to_wall_values(data, error_index, area)[:1],
         frame_interval,
-        lambda chunk: mean_std(
-            px2cm(distance_to_wall_chunk(chunk, area[1]), fish_key=fish_key)
-        ),
+        mean_std,
         error_index,
     )
 
 
 def tortuosity(data, frame_interval, error_index):
-    return calculate_result_for_interval(
-        data,
-        frame_interval,
-        lambda chunk: mean_std(tortuosity_of_chunk(chunk)),
-        error_index,
+    # the valid points of all intervals in one call of the compiled kernel
+    return tortuosity_of_intervals(
+        *valid_segments(data, frame_interval, error_index), config.KERNEL_THREADS
     )
 
 
@@ -102,16 +185,23 @@ def mean_std_median(chunk):
     return (*mean_std(chunk), np.percentile(chunk, 50))
 
 
-def absolute_angles(data, frame_interval, filter_index):
-    error_index = update_filter_three_points(compute_step_lengths(data), filter_index)
-    return calculate_result_for_interval(
-        np.abs(compute_turning_angles(data)), frame_interval, mean_std, error_index
-    )
+def absolute_angle_values(data, filter_index, kinematics=None):
+    kinematics = kinematics or compute_kinematics(data, filter_index)
+    return np.abs(kinematics["angles"]), kinematics["error_three"]
 
 
-def activity(data, frame_interval, filter_index, include_median=False):
-    steps = compute_step_lengths(data)
-    filter_index = update_filter_two_points(steps, filter_index)
+def absolute_angles(data, frame_interval, filter_index, kinematics=None):
+    angles, error_index = absolute_angle_values(data, filter_index, kinematics)
+    return calculate_result_for_interval(angles, frame_interval, mean_std, error_index)
+
+
+def activity_values(data, filter_index, kinematics=None):
+    kinematics = kinematics or compute_kinematics(data, filter_index)
+    return kinematics["steps"], kinematics["error_two"]
+
+
+def activity(data, frame_interval, filter_index, include_median=False, kinematics=None):
+    steps, filter_index = activity_values(data, filter_index, kinematics)
     return calculate_result_for_interval(
         steps,
         frame_interval,
@@ -121,13 +211,269 @@ def activity(data, frame_interval, filter_index, include_median=False):
     )
 
 
-def turning_angle(data, frame_interval, filter_index):
-    error_index = update_filter_three_points(compute_step_lengths(data), filter_index)
-    return calculate_result_for_interval(
-        compute_turning_angles(data), frame_interval, mean_std, error_index
+def turning_angle_values(data, filter_index, kinematics=None):
+    kinematics = kinematics or compute_kinematics(data, filter_index)
+    return kinematics["angles"], kinematics["error_three"]
+
+
+def turning_angle(data, frame_interval, filter_index, kinematics=None):
+    angles, error_index = turning_angle_values(data, filter_index, kinematics)
+    return calculate_result_for_interval(angles, frame_interval, mean_std, error_index)
+
+
+# metrics computed from the kinematics of the fish-day
+KINEMATICS_METRICS = [activity.__name__, turning_angle.__name__, absolute_angles.__name__]
+
+# metrics with mergeable statistics per interval: the per point values and their error index
+MOMENT_METRICS = {
+    activity.__name__: activity_values,
+    turning_angle.__name__: turning_angle_values,
+    absolute_angles.__name__: absolute_angle_values,
+    distance_to_wall.__name__: distance_to_wall_values,
+}
+
+
+def uses_stats_store(metric, metric_kwargs, time_interval):
+    """
+    The statistics of the metric are stored at config.STATS_BASE_INTERVAL and merged to time_interval.
+    The tortuosity segments and the median are not mergeable and are computed from the data.
+    """
+    return (
+        config.STATS_STORE
+        and time_interval % config.STATS_BASE_INTERVAL == 0
+        and (metric.__name__ in MOMENT_METRICS or metric.__name__ == entropy.__name__)
+        and not metric_kwargs.get("include_median", False)
     )
 
 
+def base_stats_of_day(
+    metric, data, data_cm, base_split_idx, err_filter, area_tuple, kinematics=None
+):
+    """returns the mergeable statistics of the metric for the base intervals"""
+    if metric.__name__ == entropy.__name__:
+        histograms, counts = interval_histograms(
+            data, base_split_idx, err_filter, area_tuple[1]
+        )
+        return dict(histograms=histograms, counts=counts)
+    if metric.__name__ == distance_to_wall.__name__:
+        values, error_index = distance_to_wall_values(data, err_filter, area_tuple)
+    else:
+        values, error_index = MOMENT_METRICS[metric.__name__](
+            data_cm, err_filter, kinematics
+        )
+    return dict(moments=interval_moments(values, base_split_idx, error_index))
+
+
+def roll_up_stats(metric, stats, ratio, fish_key, day=None):
+    """merges the statistics of ratio base intervals and returns the metric result for every interval"""
+    if metric.__name__ == entropy.__name__:
+        return histograms_to_entropy(
+            *merge_histograms(stats["histograms"], stats["counts"], ratio),
+            fish_key,
+            day,
+        )
+    return moments_to_mean_std(merge_moments(stats["moments"], ratio))
+
+
+def load_work_item(
+    item,
+    area,
+    metrics,
+    metrics_kwargs,
+    time_interval,
+    drop_out_of_scope=False,
+    print_logs=False,
+):
+    """
+    returns the fingerprint of the fish-day, the stored statistics of the metrics and the data of the day,
+    which is only loaded if a metric is not in the statistics store
+    """
+    fish_key, camera_id, is_back, day = item
+    fingerprint, stored = None, dict()
+    use_store = [
+        uses_stats_store(m, kw, time_interval) for m, kw in zip(metrics, metrics_kwargs)
+    ]
+    if any(use_store):
+        fingerprint = get_day_fingerprint(
+            camera_id, day, is_back, fish_key, area, drop_out_of_scope
+        )
+        for metric, store in zip(metrics, use_store):
+            stats = read_day_stats(fish_key, day, metric.__name__, fingerprint) if store else None
+            if stats is not None:
+                stored[metric.__name__] = stats
+    if all(use_store) and len(stored) == len(metrics):
+        return fingerprint, stored, None
+    day_data = load_day(
+        camera_id,
+        day,
+        is_back=is_back,
+        drop_out_of_scope=drop_out_of_scope,
+        print_logs=print_logs,
+    )  # True or False testing needed
+    advise_will_need(*day_data[1:])
+    return fingerprint, stored, day_data
+
+
+def metrics_of_day(
+    item,
+    area,
+    fingerprint,
+    stored,
+    day_data,
+    metrics,
+    metrics_kwargs,
+    out_dims,
+    time_interval,
+):
+    """
+    @params: item (fish_key, camera_id, is_back, day), area of the fish, fingerprint, stored, day_data as load_work_item,
+    metrics, metrics_kwargs, out_dims, time_interval
+    returns the result DataFrame of every metric for the day
+    """
+    fish_key, _, _, day = item
+    if day_data is not None and len(day_data[0]) == 0:
+        return [pd.DataFrame(np.empty([0, out_dim])) for out_dim in out_dims]
+    keys, frames, data = day_data if day_data is not None else (None, None, None)
+    # the filters, cm positions and kinematics are computed once for all metrics of the day
+    day_of_fish = dict(
+        fish_key=fish_key,
+        day=day,
+        area_tuple=(fish_key, area),
+        fingerprint=fingerprint,
+        frames=frames,
+        data=data,
+        err_filter=None,
+        data_cm=None,
+        base_split_idx=None,
+        kinematics=None,
+    )
+    results = []
+    for metric, metric_kwargs in zip(metrics, metrics_kwargs):
+        if metric.__name__ in stored:
+            results.append(
+                stored_result_of_day(metric, stored[metric.__name__], time_interval, fish_key, day)
+            )
+        else:
+            results.append(result_of_day(metric, metric_kwargs, day_of_fish, time_interval))
+    return results
+
+
+def stored_result_of_day(metric, stored_stats, time_interval, fish_key, day):
+    """returns the result DataFrame of the metric rolled up from the statistics of the stats store"""
+    stats, last_frame = stored_stats
+    # use the global frame index to get the precise time of the data when averaging
+    time_points = np.arange(0, last_frame, time_interval * config.FRAMES_PER_SECOND)
+    result = roll_up_stats(
+        metric,
+        stats,
+        time_interval // config.STATS_BASE_INTERVAL,
+        fish_key,
+        day,
+    )
+    return pd.DataFrame(result, index=time_points)
+
+
+def prepare_day_for_metric(metric, metric_kwargs, day_of_fish):
+    """
+    computes the error filter, cm positions and kinematics of day_of_fish needed by the metric, once per day
+    returns the metric_kwargs of the metric for the day
+    """
+    fish_key, day, data = day_of_fish["fish_key"], day_of_fish["day"], day_of_fish["data"]
+    if day_of_fish["err_filter"] is None:
+        day_of_fish["err_filter"] = all_error_filters(
+            data, day_of_fish["area_tuple"], fish_key=fish_key, day=day
+        )
+    if day_of_fish["data_cm"] is None and metric.__name__ not in [  # metrics in pixels using the area config
+        entropy.__name__,
+        distance_to_wall.__name__,
+    ]:
+        day_of_fish["data_cm"] = get_transform(fish_key).to_cm(data)
+    if metric.__name__ == entropy.__name__:
+        metric_kwargs = dict(metric_kwargs, day=day)  # to record the dropped points
+    if metric.__name__ in KINEMATICS_METRICS:
+        # steps, angles and error masks are computed once for all metrics of the day
+        if day_of_fish["kinematics"] is None:
+            day_of_fish["kinematics"] = compute_kinematics(
+                day_of_fish["data_cm"], day_of_fish["err_filter"]
+            )
+        metric_kwargs = dict(metric_kwargs, kinematics=day_of_fish["kinematics"])
+    return metric_kwargs
+
+
+def result_of_day(metric, metric_kwargs, day_of_fish, time_interval):
+    """
+    @params: metric, metric_kwargs, day_of_fish as in metrics_of_day, time_interval
+    returns the result DataFrame of the metric computed from the data of the day,
+    with the stats store the statistics of the base intervals are written and rolled up
+    """
+    metric_kwargs = prepare_day_for_metric(metric, metric_kwargs, day_of_fish)
+    fish_key, day, frames = day_of_fish["fish_key"], day_of_fish["day"], day_of_fish["frames"]
+    data, data_cm = day_of_fish["data"], day_of_fish["data_cm"]
+    err_filter, area_tuple = day_of_fish["err_filter"], day_of_fish["area_tuple"]
+    # use the global frame index to get the precise time of the data when averaging
+    time_points = np.arange(0, int(frames[-1]), time_interval * config.FRAMES_PER_SECOND)
+    if uses_stats_store(metric, metric_kwargs, time_interval) and frames[-1] > 0:
+        # statistics of the base intervals, stored to derive any multiple of the base interval
+        if day_of_fish["base_split_idx"] is None:
+            base_points = np.arange(
+                0, int(frames[-1]), config.STATS_BASE_INTERVAL * config.FRAMES_PER_SECOND
+            )
+            day_of_fish["base_split_idx"] = np.searchsorted(frames, base_points[1:])
+        stats = base_stats_of_day(
+            metric,
+            data,
+            data_cm,
+            day_of_fish["base_split_idx"],
+            err_filter,
+            area_tuple,
+            metric_kwargs.get("kinematics"),
+        )
+        write_day_stats(
+            fish_key, day, metric.__name__, day_of_fish["fingerprint"], frames[-1], stats
+        )
+        result = roll_up_stats(
+            metric,
+            stats,
+            time_interval // config.STATS_BASE_INTERVAL,
+            fish_key,
+            day,
+        )
+    elif metric.__name__ in [entropy.__name__, distance_to_wall.__name__]:
+        # DISTANCE TO WALL METRIC
+        result = metric(
+            data,
+            np.searchsorted(frames, time_points[1:]),
+            err_filter,
+            area_tuple,
+            **metric_kwargs
+        )
+    else:
+        result = metric(
+            data_cm, np.searchsorted(frames, time_points[1:]), err_filter, **metric_kwargs
+        )
+    # concat the results array with the index of df for every time_interval step
+    return pd.DataFrame(result, index=time_points)
+
+
+def metrics_of_work_item(args):
+    """process pool task: loads the fish-day of the work item and returns metrics_of_day"""
+    item, area, load_kwargs, metrics_args = args
+    metrics, metrics_kwargs, _, time_interval = metrics_args
+    day_data = load_work_item(
+        item, area, metrics, metrics_kwargs, time_interval, **load_kwargs
+    )
+    results = metrics_of_day(item, area, *day_data, *metrics_args)
+    return results, pop_dropped_points()
+
+
+def get_metric_out_dim(metric, include_median=False):
+    if metric.__name__ == entropy.__name__:
+        return 2
+    if metric.__name__ == activity.__name__ and include_median:
+        return 4
+    return 3
+
+
 def metric_per_interval(
     fish_ids=None,
     time_interval=100,
@@ -138,6 +484,8 @@ def metric_per_interval(
     out_dim=3,
     include_median=False,
     print_logs=False,
+    workers=None,
+    incremental=False,
 ):
     """
     Applies a given function to all fishes in fish_ids with the time_interval, for all days in the day_interval interval
@@ -147,90 +495,227 @@ def metric_per_interval(
         day_interval(Tuple):    Tuple of the first day to the last day, out of 0 to 29.
         metric(function):       A function to apply to the data, {activity, tortuosity, turning_angle,...}
         write_to_csv(bool):     Indicate weather the results should be written to a csv
+        workers(int):           Number of processes to compute the fish-days, default config.WORKERS
+        incremental(bool):      Only compute the fish-days that changed since the csv was written
     Returns:
         package:                dict of computed results, and meta information
     """
+    return metrics_per_interval(
+        fish_ids=fish_ids,
+        time_interval=time_interval,
+        day_interval=day_interval,
+        metrics=[metric],
+        write_to_csv=write_to_csv,
+        drop_out_of_scope=drop_out_of_scope,
+        out_dims=[
+            out_dim + 1 if include_median and metric.__name__ == activity.__name__ else out_dim
+        ],
+        include_median=include_median,
+        print_logs=print_logs,
+        workers=workers,
+        incremental=incremental,
+    )[0]
+
+
+def get_work_items(fish_ids=None, day_interval=None):
+    """
+    returns the fish_keys of the fishes in fish_ids, all fishes for None,
+    and their work items (fish_key, camera_id, is_back, day) in the order of the days
+    """
     if isinstance(fish_ids, int):
         fish_ids = [fish_ids]
     fish2camera = get_fish2camera_map()
     if fish_ids is None:
         fish_ids = [i for i in range(len(fish2camera))]
-    area_func = get_area_functions()
-    results = dict()
-    package = dict(
-        metric_name=metric.__name__,
-        time_interval=time_interval,
-        results=results,
-    )
-    metric_kwargs = dict()
-    if include_median:
-        out_dim = out_dim + 1
-        metric_kwargs.update(include_median=include_median)
-
-    for i, fish in enumerate(fish_ids):
+    fish_keys, work_items = [], []
+    for fish in fish_ids:
         camera_id, is_back = fish2camera[fish, 0], fish2camera[fish, 1] == config.BACK
         fish_key = "%s_%s" % (camera_id, fish2camera[fish, 1])
-        day_dict = dict()
+        fish_keys.append(fish_key)
         days = get_days_in_order(
             interval=day_interval,
             camera=camera_id,
             is_back=is_back,
         )
-        for j, day in enumerate(days):
-            keys, data_in_batches = csv_of_the_day(
-                camera_id,
-                day,
-                is_back=is_back,
-                drop_out_of_scope=drop_out_of_scope,
-                print_logs=print_logs,
-            )  # True or False testing needed
-            if len(data_in_batches) > 0:
-                daytime_DF = (
-                    start_time_of_day_to_seconds(day.split("_")[1])
-                    * config.FRAMES_PER_SECOND
-                )
-                # use index frames to get the precis time of the data when averaging
-                for k, dfi in zip(keys, data_in_batches):
-                    dfi.index = dfi.FRAME + (int(k) * config.BATCH_SIZE)  # +daytime_DF
-                df = pd.concat(data_in_batches)
-                step = time_interval * config.FRAMES_PER_SECOND
-                time_points = np.arange(0, int(df.index[-1]), step)
-                split_by_interval_idx = [
-                    bisect.bisect_left(df.index, h) for h in time_points[1:]
-                ]
-                data = df[["xpx", "ypx"]].to_numpy()
-                area_tuple = (fish_key, area_func(fish_key))
-                err_filter = all_error_filters(
-                    data, area_tuple, fish_key=fish_key, day=day
-                )
-
-                if metric.__name__ in [  # metrics in pixels using the area config
-                    entropy.__name__,
-                    distance_to_wall.__name__,
-                ]:
-                    # DISTANCE TO WALL METRIC
-                    result = metric(
-                        data,
-                        split_by_interval_idx,
-                        err_filter,
-                        area_tuple,
-                        **metric_kwargs
-                    )
-                else:
-                    data_cm = pixel_to_cm(data, fish_key=fish_key)
-                    result = metric(
-                        data_cm, split_by_interval_idx, err_filter, **metric_kwargs
-                    )
-                # concat the results array with the index of df for every time_interval step
-                result = pd.DataFrame(result, index=time_points)
-                day_dict[day] = result
-            else:
-                day_dict[day] = pd.DataFrame(np.empty([0, out_dim]))
-
-        results[fish_key] = day_dict
+        work_items.extend([(fish_key, camera_id, is_back, day) for day in days])
+    return fish_keys, work_items
+
+
+def fingerprints_of_work_items(work_items, area_func, drop_out_of_scope):
+    """returns the fingerprint of every work item (fish_key, camera_id, is_back, day) as get_day_fingerprint"""
+    return dict(
+        (
+            (fish_key, camera_id, is_back, day),
+            get_day_fingerprint(
+                camera_id, day, is_back, fish_key, area_func(fish_key), drop_out_of_scope
+            ),
+        )
+        for fish_key, camera_id, is_back, day in work_items
+    )
+
+
+def fingerprints_per_fish(fingerprints, fish_keys):
+    """returns the fingerprints of fingerprints_of_work_items as {fish_key: {day: fingerprint}} for the csv files"""
+    day_fingerprints = dict((fish_key, dict()) for fish_key in fish_keys)
+    for (fish_key, _, _, day), fingerprint in fingerprints.items():
+        day_fingerprints[fish_key][day] = fingerprint
+    return day_fingerprints
+
+
+def changed_work_items(work_items, fingerprints, packages, out_dims, time_interval):
+    """
+    compares the fingerprints of the work items with the ones recorded in the csv files of the metrics
+    returns changed_items: the work items to compute,
+    carried_results: {item: [result of every metric]} read from the csv files for the unchanged work items
+    """
+    previous = [
+        read_metric_result_csv(package["metric_name"], time_interval, out_dim)
+        for package, out_dim in zip(packages, out_dims)
+    ]
+    changed_items, carried_results = [], dict()
+    for item in work_items:
+        fish_key, _, _, day = item
+        if all(
+            prev_fingerprints.get(fish_key, dict()).get(day) == fingerprints[item]
+            for _, prev_fingerprints in previous
+        ):
+            carried_results[item] = [
+                prev_results.get(fish_key, dict()).get(day, pd.DataFrame(np.empty([0, out_dim])))
+                for (prev_results, _), out_dim in zip(previous, out_dims)
+            ]
+        else:
+            changed_items.append(item)
+    return changed_items, carried_results
+
+
+def set_results_of_day(packages, item, results):
+    """sets the result of every metric of the work item in the packages"""
+    fish_key, _, _, day = item
+    for package, result in zip(packages, results):
+        package["results"][fish_key][day] = result
+
+
+def results_of_work_items(work_items, area_func, load_kwargs, metrics_args, workers):
+    """
+    @params: work_items, area_func as get_area_functions, load_kwargs of load_work_item,
+    metrics_args (metrics, metrics_kwargs, out_dims, time_interval), workers number of processes
+    yields (item, results) with the result of every metric for the work items in order
+    """
+    metrics, metrics_kwargs, _, time_interval = metrics_args
+    if workers > 1 and len(work_items) > 1:
+        # the fish-days are distributed over a process pool, imap keeps the order of the work items,
+        # the workers start with the configuration of this process, e.g. set from the command line,
+        # and the geometry loaded here instead of parsing the area files again
+        get_calibration_functions()
+        with mp.Pool(
+            min(workers, len(work_items)),
+            initializer=init_worker,
+            initargs=worker_initargs(),
+        ) as pool:
+            day_results = pool.imap(
+                metrics_of_work_item,
+                [
+                    (item, area_func(item[0]), load_kwargs, metrics_args)
+                    for item in work_items
+                ],
+            )
+            for item, (results, dropped_points) in zip(work_items, day_results):
+                extend_dropped_points(dropped_points)
+                yield item, results
+    else:
+        # the next fish-day is loaded in the background while the current one is processed
+        for item, day_data in prefetch(
+            work_items,
+            lambda item: load_work_item(
+                item, area_func(item[0]), metrics, metrics_kwargs, time_interval, **load_kwargs
+            ),
+        ):
+            yield item, metrics_of_day(item, area_func(item[0]), *day_data, *metrics_args)
+
+
+def metrics_per_interval(
+    fish_ids=None,
+    time_interval=100,
+    day_interval=None,
+    metrics=[activity],
+    write_to_csv=False,
+    drop_out_of_scope=False,
+    out_dims=None,
+    include_median=False,
+    print_logs=False,
+    workers=None,
+    incremental=False,
+):
+    """
+    Applies all metrics in one pass: every fish-day is loaded, filtered and converted to cm once
+    Args:
+        metrics(list):          Functions to apply to the data, {activity, tortuosity, turning_angle,...}
+        out_dims(list):         Number of result columns of every metric, default by get_metric_out_dim
+        include_median(bool):   Include the median for the activity metric
+        workers(int):           Number of processes to compute the fish-days, default config.WORKERS
+        incremental(bool):      With write_to_csv, only the fish-days whose batch files, filter thresholds,
+                                calibration or area changed are computed, the others are read from the csv
+        other args as metric_per_interval
+    Returns:
+        packages:               list with the package of every metric
+    """
+    if out_dims is None:
+        out_dims = [get_metric_out_dim(m, include_median) for m in metrics]
+    fish_keys, work_items = get_work_items(fish_ids, day_interval)
+    area_func = get_area_functions()
+    packages = [
+        dict(
+            metric_name=metric.__name__,
+            time_interval=time_interval,
+            results=dict((fish_key, dict()) for fish_key in fish_keys),
+        )
+        for metric in metrics
+    ]
+    metrics_kwargs = [
+        dict(include_median=include_median)
+        if include_median and metric.__name__ == activity.__name__
+        else dict()
+        for metric in metrics
+    ]
+
+    fingerprints = None
     if write_to_csv:
-        metric_result_to_csv(**package)
-    return package
+        # recorded next to the csv files, an incremental run skips the fish-days with the same fingerprint
+        fingerprints = fingerprints_of_work_items(work_items, area_func, drop_out_of_scope)
+    if incremental and write_to_csv:
+        changed_items, carried_results = changed_work_items(
+            work_items, fingerprints, packages, out_dims, time_interval
+        )
+        for item in work_items:  # keeps the order of the days
+            set_results_of_day(packages, item, carried_results.get(item, [None] * len(packages)))
+        print(
+            "incremental: %d of %d fish-days changed"
+            % (len(changed_items), len(work_items))
+        )
+        work_items = changed_items
+
+    load_kwargs = dict(drop_out_of_scope=drop_out_of_scope, print_logs=print_logs)
+    metrics_args = (metrics, metrics_kwargs, out_dims, time_interval)
+    workers = config.WORKERS if workers is None else workers
+    for item, results in results_of_work_items(
+        work_items, area_func, load_kwargs, metrics_args, workers
+    ):
+        set_results_of_day(packages, item, results)
+    if entropy in metrics:
+        report_dropped_points(
+            get_filename_for_metric_csv(
+                entropy.__name__,
+                get_interval_name_from_seconds(time_interval),
+                measure_name="dropped_points",
+            )
+            if write_to_csv
+            else None
+        )
+    if write_to_csv:
+        day_fingerprints = fingerprints_per_fish(fingerprints, packages[0]["results"])
+        for package in packages:
+            metric_result_to_csv(**package, fingerprints=day_fingerprints)
+    return packages
 
 
 def activity_per_interval(*args, **kwargs):
@@ -255,3 +740,19 @@ def entropy_per_interval(*args, **kwargs):
 
 def distance_to_wall_per_interval(*args, **kwargs):
     return metric_per_interval(*args, **kwargs, metric=distance_to_wall)
+
+
+def all_metrics_per_interval(*args, **kwargs):
+    """computes activity, turning angle, absolute angle, tortuosity, entropy and wall distance in one pass"""
+    return metrics_per_interval(
+        *args,
+        **kwargs,
+        metrics=[
+            activity,
+            turning_angle,
+            absolute_angles,
+            tortuosity,
+            entropy,
+            distance_to_wall,
+        ]
+    )
@@ -1,3 +1,4 @@
+import json
 import os
 import numpy as np
 import pandas as pd
@@ -25,7 +26,13 @@ def get_csv_columns_from_results_dim(dimension, metric_name):
         raise ValueError("dimension must be either 2, 3 or 4, but was %s" % dimension)
 
 
-def metric_result_to_csv(results=None, metric_name=None, time_interval=None):
+def metric_result_to_csv(
+    results=None, metric_name=None, time_interval=None, fingerprints=None
+):
+    """
+    writes the results of every fish-day to one csv file per metric and time interval,
+    the fingerprints of the fish-days {fish_key: {day: fingerprint}} are written next to it for incremental runs
+    """
     columns = ["cam_pos", "day", "df_index"]
     interval_name = get_interval_name_from_seconds(time_interval)
     df_sum = pd.concat(
@@ -54,6 +61,38 @@ def metric_result_to_csv(results=None, metric_name=None, time_interval=None):
         float_format=config.float_format,
         sep=config.sep,
     )
+    if fingerprints is not None:
+        with open(get_fingerprints_filename(metric_name, interval_name), "w") as f:
+            json.dump(fingerprints, f, indent=1)
+
+
+def read_metric_result_csv(metric_name=None, time_interval=None, out_dim=3):
+    """
+    reads the csv file written by metric_result_to_csv
+    returns the results {fish_key: {day: DataFrame}} and the fingerprints of the fish-days,
+    both empty if the csv file or the fingerprints are missing or the columns do not match out_dim
+    """
+    interval_name = get_interval_name_from_seconds(time_interval)
+    try:
+        with open(get_fingerprints_filename(metric_name, interval_name)) as f:
+            fingerprints = json.load(f)
+        df_sum = pd.read_csv(
+            get_filename_for_metric_csv(metric_name, interval_name),
+            sep=config.sep,
+            index_col=0,
+            dtype={"cam_pos": str, "day": str},
+        )
+    except (OSError, ValueError):
+        return dict(), dict()
+    measures = get_csv_columns_from_results_dim(out_dim, metric_name)
+    if not all(c in df_sum.columns for c in measures):
+        return dict(), dict()
+    results = dict()
+    for (fish_key, day), df_day in df_sum.groupby(["cam_pos", "day"], sort=False):
+        results.setdefault(fish_key, dict())[day] = pd.DataFrame(
+            df_day[measures].values.astype(float), index=df_day["df_index"].values
+        )
+    return results, fingerprints
 
 
 # generates csv file name for a metric and a time interval
@@ -78,6 +117,13 @@ def get_filename_for_metric_csv(
         return "%s/%s_%s.csv" % (directory, time_interval, metric_name)
 
 
+def get_fingerprints_filename(metric_name, time_interval):
+    """the fingerprints of the fish-days of the csv file of get_filename_for_metric_csv"""
+    return "%s_fingerprints.json" % get_filename_for_metric_csv(
+        metric_name, time_interval
+    )[: -len(".csv")]
+
+
 def get_results_directory(metric_name):
     directory = "%s/%s" % (
         config.RESULTS_PATH,
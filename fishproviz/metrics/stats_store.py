@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import numpy as np
+import fishproviz.config as config
+from fishproviz.utils.archive import get_source_file
+from fishproviz.utils.batch_cache import get_source_signature
+from fishproviz.utils.utile import batch_files_of_the_day
+from fishproviz.utils.transformation import px2cm
+
+STATS_SUBDIR = "stats"
+STATS_VERSION = 1
+
+
+def get_day_fingerprint(camera, day, is_back, fish_key, area, drop_out_of_scope=False):
+    """
+    returns a hash of everything the metrics of a fish-day depend on:
+    the batch files and their signatures, the filter thresholds, the calibration and the area of the fish
+    """
+    keys, filenames = batch_files_of_the_day(camera, day, is_back=is_back)
+    inputs = dict(
+        version=STATS_VERSION,
+        files=[
+            [f, *get_source_signature(get_source_file(f)).tolist()] for f in filenames
+        ],
+        drop_out_of_scope=drop_out_of_scope,
+        batch_size=config.BATCH_SIZE,
+        frames_per_second=config.FRAMES_PER_SECOND,
+        spike_threshold=config.SPIKE_THRESHOLD,
+        dirt_threshold=config.DIRT_THRESHOLD,
+        threshold_area_px=config.THRESHOLD_AREA_PX,
+        area_filter=config.AREA_FILTER,
+        dirt_filter=config.DIRT_FILTER,
+        distance_grid=config.DISTANCE_GRID and float(config.DISTANCE_GRID_RESOLUTION),
+        compact_dtypes=config.COMPACT_DTYPES,
+        calibration=float(px2cm(1.0, fish_key=fish_key)),
+        area=None if area is None else np.asarray(area).tolist(),
+    )
+    return hashlib.sha1(json.dumps(inputs).encode()).hexdigest()
+
+
+def get_stats_filename(fish_key, day, metric_name):
+    return "%s/%s/%s/%s/%s.npz" % (
+        config.CACHE_DIR,
+        STATS_SUBDIR,
+        fish_key,
+        day,
+        metric_name,
+    )
+
+
+def read_day_stats(fish_key, day, metric_name, fingerprint):
+    """returns the arrays and the last frame of the stored statistics, None if missing or outdated"""
+    filename = get_stats_filename(fish_key, day, metric_name)
+    try:
+        with np.load(filename) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if (
+                meta["fingerprint"] != fingerprint
+                or meta["base_interval"] != config.STATS_BASE_INTERVAL
+            ):
+                return None
+            return {k: npz[k] for k in npz.files if k != "meta"}, meta["last_frame"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_day_stats(fish_key, day, metric_name, fingerprint, last_frame, arrays):
+    filename = get_stats_filename(fish_key, day, metric_name)
+    meta = dict(
+        fingerprint=fingerprint,
+        base_interval=config.STATS_BASE_INTERVAL,
+        last_frame=int(last_frame),
+    )
+    tmp_file = "%s.%d.tmp.npz" % (filename[: -len(".npz")], os.getpid())
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        np.savez_compressed(tmp_file, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp_file, filename)
+    except OSError as e:
+        print("WARNING: could not write the statistics %s: %s" % (filename, e))
@@ -5,7 +5,8 @@ import numpy as np
 import warnings
 from time import gmtime, strftime
 import fishproviz.config as config
-from fishproviz.metrics.metrics import compute_step_lengths, num_of_spikes
+from fishproviz.metrics.compute_metrics import compute_step_lengths
+from fishproviz.metrics.metrics import num_of_spikes
 from fishproviz.trajectory.feeding_shape import FeedingEllipse, FeedingPatch
 from fishproviz.utils import (
     get_days_in_order,
@@ -14,7 +15,7 @@ from fishproviz.utils import (
 )
 from fishproviz.utils.utile import start_time_of_day_to_seconds, get_seconds_from_time
 from .trajectory import Trajectory
-from fishproviz.utils.transformation import pixel_to_cm
+from fishproviz.utils.transformation import get_transform
 
 map_shape = {"patch": FeedingPatch, "ellipse": FeedingEllipse}
 FT_DATE, FT_START, FT_END = (
@@ -100,7 +101,11 @@ class FeedingTrajectory(Trajectory):
         feeding_filter = batch.FRAME.between(start_idx, end_idx)
         fish_key = "%s_%s" % tuple(self.fish2camera[fish_id])
 
-        batchxy = pixel_to_cm(batch[["xpx", "ypx"]].to_numpy(), fish_key=fish_key)
+        transform = get_transform(fish_key)
+        batchxy = np.column_stack(
+            (batch.xpx.to_numpy(np.float64), batch.ypx.to_numpy(np.float64))
+        )
+        transform.to_cm(batchxy, out=batchxy)  # in place, batchxy is a new array
         F.line.set_data(*batchxy.T)
 
         feeding_b, box = self.FeedingShape.contains(
@@ -124,10 +129,11 @@ class FeedingTrajectory(Trajectory):
             ]  # The first visit to the box clearly happens at index 0 of feeding_b and the last visit ends at the last index of feeding_b
             n_entries = len(index_visits) - 1  # -1 for the last out index
 
-        fb = pixel_to_cm(feeding_b[["xpx", "ypx"]].to_numpy(), fish_key=fish_key).T
+        # the points in the box are already transformed in batchxy
+        fb = batchxy[batch.index.get_indexer(feeding_b.index)].T
         lines = F.ax.get_lines()
         # UPDATE BOX
-        box_cm = pixel_to_cm(box, fish_key)
+        box_cm = transform.to_cm(box)
         lines[1].set_data(*box_cm.T)
 
         lines = lines[2:]
@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 import pandas as pd
 import numpy as np
 import fishproviz.config as config
+from fishproviz.utils import geometry
 from fishproviz.utils.feeding_maze_config import MAZE, read_maze_data_from_json
 
 
@@ -19,7 +20,11 @@ class FeedingEllipse(FeedingShape):
 
     def __init__(self):
         """Initializes the ellipse data"""
-        self.dict_ellipses = read_maze_data_from_json()
+        self.dict_ellipses = geometry.get_entry(
+            "maze_ellipses",
+            ["%s/%s" % (config.CONFIG_DATA, config.MAZE_FILE)],
+            lambda: read_maze_data_from_json(config.CONFIG_DATA),
+        )
 
     # overrideing the contains method
     def contains(self, data_points, fish_key, day=None):
@@ -37,11 +42,14 @@ class FeedingEllipse(FeedingShape):
             (data_points["xpx"] - ori_x) ** 2 / a**2
             + (data_points["ypx"] - ori_y) ** 2 / b**2
         ) <= 1
-        return data_points[in_ellipse], np.array(
-            [
-                (ori_x + a * np.cos(alpha), ori_y + b * np.sin(alpha))
-                for alpha in np.linspace(0, 2 * np.pi, 100)
-            ]
+        return data_points[in_ellipse], geometry.get_derived(
+            ("ellipse_outline", fish_key, day),
+            lambda: np.array(
+                [
+                    (ori_x + a * np.cos(alpha), ori_y + b * np.sin(alpha))
+                    for alpha in np.linspace(0, 2 * np.pi, 100)
+                ]
+            ),
         )
 
 
@@ -50,7 +58,9 @@ class FeedingPatch(FeedingShape):
 
     def __init__(self):
         """Initializes the square data"""
-        self.patches = get_feeding_patches()
+        self.patches = geometry.get_entry(
+            "feeding_patches", [config.FEEDING_PATCH_COORDS_FILE], get_feeding_patches
+        )
 
     # overrideing the contains method
     def contains(self, data_points, fish_key, day=None):
@@ -6,7 +6,7 @@ import os
 import sys
 from tqdm import tqdm
 import fishproviz.config as config
-from fishproviz.metrics.metrics import compute_turning_angles
+from fishproviz.metrics.compute_metrics import compute_turning_angles
 from fishproviz.utils import (
     csv_of_the_day,
     get_position_string,
@@ -20,11 +20,15 @@ from fishproviz.metrics import (
     get_gaps_in_dataframes,
     activity_mean_sd,
 )
-from fishproviz.utils.transformation import pixel_to_cm
+from fishproviz.utils.prefetch import prefetch
+from fishproviz.utils.tank_area_config import get_area_functions, get_calibration_functions
+from fishproviz.utils.transformation import get_transform
 from fishproviz.utils.utile import (
     get_start_time_directory,
     get_timestamp,
-    create_directory
+    create_directory,
+    init_worker,
+    worker_initargs,
 ) 
 
 mpl.rcParams["lines.linewidth"] = 0.5
@@ -33,6 +37,12 @@ mpl.rcParams["lines.markersize"] = 1.0
 mpl.rcParams["figure.figsize"] = (4, 2)
 
 
+def load_day_for_plots(item):
+    """loads the batches of a work item (..., camera_id, is_back, day)"""
+    camera_id, is_back, day = item[-3:]
+    return csv_of_the_day(camera_id, day, is_back=is_back, drop_out_of_scope=True)
+
+
 class Figure:
     def __init__(self, is_back=False, marker_char=""):
         self.is_back = is_back
@@ -159,7 +169,10 @@ class Trajectory:
             batch.drop(batch.tail(1).index)
 
         fish_key = "%s_%s" % tuple(self.fish2camera[fish_id])
-        batchxy = pixel_to_cm(batch[["xpx", "ypx"]].to_numpy(), fish_key=fish_key)
+        batchxy = np.column_stack(
+            (batch.xpx.to_numpy(np.float64), batch.ypx.to_numpy(np.float64))
+        )
+        get_transform(fish_key).to_cm(batchxy, out=batchxy)  # in place, batchxy is a new array
         F.line.set_data(*batchxy.T)
         # draw spikes where datapoints were lost
         # ax.draw_artist(ax.patch)
@@ -205,7 +218,14 @@ class Trajectory:
         if self.parallel:
             num_processors = mp.cpu_count() - 2
             self.reset_data()
-            with mp.Pool(num_processors) as pool:
+            # the workers start with the configuration, areas and calibrations of this process
+            get_area_functions()
+            get_calibration_functions()
+            with mp.Pool(
+                num_processors,
+                initializer=init_worker,
+                initargs=worker_initargs(),
+            ) as pool:
                 _ = list(tqdm(
                     pool.imap(
                         self.plot_for_individual_parallel,
@@ -221,26 +241,30 @@ class Trajectory:
             pool.join()
         else:
             N = len(self.fish2camera[fish_ids])
+            work_items = []
             for i, fish_idx in enumerate(fish_ids):
                 camera_id, pos = self.fish2camera[fish_idx]
                 is_back = pos == config.BACK
                 day_list = get_days_in_order(camera=camera_id, is_back=is_back)
                 N_days = len(day_list)
-                for j, day in enumerate(day_list):
-                    sys.stdout.write("\r")
-                    # write the progress to stdout
-                    progress = i / N + j / (N * N_days)
-                    sys.stdout.write(
-                        "[%-20s] %d%%" % ("=" * int(20 * progress), 100 * progress)
-                    )
-                    sys.stdout.flush()
+                work_items.extend(
+                    [(i, j, N_days, fish_idx, camera_id, is_back, day) for j, day in enumerate(day_list)]
+                )
+            # the csv files of the next day are read while the current day is plotted
+            for (i, j, N_days, fish_idx, camera_id, is_back, day), (keys, day_df) in prefetch(
+                work_items, load_day_for_plots
+            ):
+                sys.stdout.write("\r")
+                # write the progress to stdout
+                progress = i / N + j / (N * N_days)
+                sys.stdout.write(
+                    "[%-20s] %d%%" % ("=" * int(20 * progress), 100 * progress)
+                )
+                sys.stdout.flush()
 
-                    keys, day_df = csv_of_the_day(
-                        camera_id, day, is_back=is_back, drop_out_of_scope=True
-                    )
-                    self.plot_day_camera_fast(
-                        day_df, keys, camera_id, day, fish_idx, is_back=is_back
-                    )
+                self.plot_day_camera_fast(
+                    day_df, keys, camera_id, day, fish_idx, is_back=is_back
+                )
 
     
     def plot_for_individual_parallel(
@@ -252,11 +276,13 @@ class Trajectory:
         is_back = pos == config.BACK
         day_list = get_days_in_order(camera=camera_id, is_back=is_back)
         N_days = len(day_list)
-        for j, day in enumerate(tqdm(day_list, desc=f'id: {camera_id}_{pos}', position=current._identity[0]+1)):
-
-            keys, day_df = csv_of_the_day(
-                camera_id, day, is_back=is_back, drop_out_of_scope=True
-            )
+        work_items = [(camera_id, is_back, day) for day in day_list]
+        for (_, _, day), (keys, day_df) in tqdm(
+            prefetch(work_items, load_day_for_plots),
+            total=N_days,
+            desc=f'id: {camera_id}_{pos}',
+            position=current._identity[0]+1,
+        ):
             self.plot_day_camera_fast(
                 day_df, keys, camera_id, day, fish_idx, is_back=is_back
             )
@@ -0,0 +1,126 @@
+import json
+import os
+import numpy as np
+import fishproviz.config as config
+from .npz_reader import filter_batch_columns
+
+ARCHIVE_VERSION = 1
+ARCHIVE_MEMBER_SEP = "::"  # batch paths of the archive backend: {day_archive}::{batch_key}
+ARCHIVE_COLUMNS = ["FRAME", "x", "y", "xpx", "ypx", "time"]
+DELTA_COLUMNS = ["FRAME", "time"]
+INT_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def get_archive_directory(is_back=False):
+    return "%s/%s" % (config.ARCHIVE_DIR, config.BACK if is_back else config.FRONT)
+
+
+def get_archive_filename(camera, day, is_back=False):
+    """the day archives are named like the day directories {day}.{camera}, so the days are listed the same way"""
+    return "%s/%s/%s.%s.npz" % (get_archive_directory(is_back), camera, day, camera)
+
+
+def is_archive_batch(filename):
+    return ARCHIVE_MEMBER_SEP in filename
+
+
+def split_archive_batch(filename):
+    """returns the day archive and the batch key of an archive batch path"""
+    archive_file, key = filename.rsplit(ARCHIVE_MEMBER_SEP, 1)
+    return archive_file, key
+
+
+def get_source_file(filename):
+    """returns the file on disk of a batch path, the day archive for archive batches"""
+    return split_archive_batch(filename)[0] if is_archive_batch(filename) else filename
+
+
+def encode_column(values, delta=False):
+    """
+    lossless encoding of a column: integral values as the smallest integer type, delta encoded for FRAME and time,
+    other values as float32 if they are float32 numbers (as written by the tracker) else float64
+    returns the encoded array and the encoding
+    """
+    values = np.asarray(values)
+    if values.size > 0 and np.all(np.isfinite(values)) and np.all(values == np.round(values)):
+        ints = values.astype(np.int64)
+        if delta:
+            ints = np.diff(ints, prepend=0)
+        for dtype in INT_DTYPES:
+            info = np.iinfo(dtype)
+            if ints.min() >= info.min and ints.max() <= info.max:
+                return ints.astype(dtype), "delta" if delta else "int"
+    if np.array_equal(values.astype(np.float32).astype(values.dtype), values, equal_nan=True):
+        return values.astype(np.float32), "float"
+    return values.astype(np.float64), "float"
+
+
+def decode_column(array, encoding):
+    if encoding == "delta":
+        return np.cumsum(array, dtype=np.int64)
+    return array
+
+
+def write_day_archive(filename, keys, batches, meta):
+    """
+    @params: filename, keys, batches -- list of the ARCHIVE_COLUMNS arrays of every batch, meta -- json serializable dict
+    writes one compressed .npz for the day, every column of a batch is a member {key}_{column}
+    """
+    members = dict()
+    encodings = dict()
+    for key, batch in zip(keys, batches):
+        for c, values in zip(ARCHIVE_COLUMNS, batch):
+            members["%s_%s" % (key, c)], encodings["%s_%s" % (key, c)] = encode_column(
+                values, delta=c in DELTA_COLUMNS
+            )
+    meta = dict(meta, version=ARCHIVE_VERSION, keys=list(keys), encodings=encodings)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_file = "%s.%d.tmp.npz" % (filename[: -len(".npz")], os.getpid())
+    np.savez_compressed(tmp_file, meta=np.array(json.dumps(meta)), **members)
+    os.replace(tmp_file, filename)
+
+
+def read_archive_meta(filename):
+    with np.load(filename) as npz:
+        meta = json.loads(str(npz["meta"]))
+    if meta.get("version") != ARCHIVE_VERSION:
+        raise ValueError(
+            "%s has archive version %s, expected %s"
+            % (filename, meta.get("version"), ARCHIVE_VERSION)
+        )
+    return meta
+
+
+def read_archive_columns(filename, columns):
+    """
+    @params: filename -- archive batch path {day_archive}::{key}, columns
+    returns the decoded arrays of the columns, FRAME as int64 and the other columns as float64
+    """
+    archive_file, key = split_archive_batch(filename)
+    with np.load(archive_file) as npz:
+        encodings = json.loads(str(npz["meta"]))["encodings"]
+        values = [
+            decode_column(npz["%s_%s" % (key, c)], encodings["%s_%s" % (key, c)])
+            for c in columns
+        ]
+    return [v.astype(np.int64 if c == "FRAME" else np.float64) for v, c in zip(values, columns)]
+
+
+def read_batch_archive(filename, columns=["FRAME", "xpx", "ypx"], drop_errors=False):
+    """
+    @params: filename -- archive batch path {day_archive}::{key}, columns, drop_errors
+    returns the same as read_batch_arrays for a batch of a day archive
+    """
+    unknown = [c for c in columns if c not in ARCHIVE_COLUMNS]
+    if len(unknown) > 0:
+        raise ValueError("the archive has no columns %s" % ", ".join(unknown))
+    return filter_batch_columns(read_archive_columns(filename, columns), columns, drop_errors)
+
+
+def match_archive_batches(filename):
+    """returns missing_numbers, duplicate_f, correct_f, corrupted_f recorded when the day was archived"""
+    meta = read_archive_meta(filename)
+    correct_f = dict(
+        (k, "%s%s%s" % (filename, ARCHIVE_MEMBER_SEP, k)) for k in meta["keys"]
+    )
+    return meta["missing"], meta["duplicates"], correct_f, meta["corrupted"]
@@ -0,0 +1,119 @@
+import os
+import numpy as np
+import fishproviz.config as config
+from .archive import (
+    ARCHIVE_COLUMNS,
+    ARCHIVE_MEMBER_SEP,
+    get_archive_directory,
+    get_archive_filename,
+    read_archive_columns,
+    read_archive_meta,
+    write_day_archive,
+)
+from .batch_cache import get_source_signature
+from .utile import (
+    get_days_in_order,
+    get_directory,
+    get_fish2camera_map,
+    map_batch_files,
+    match_batch_files_of_the_day,
+    read_batch_arrays,
+)
+
+CSV_FORMATS = ["%d", "%.17g", "%.17g", "%.17g", "%.17g", "%.17g"]  # exact round trip of the archived values
+
+
+def export_archive(fish_ids=None, overwrite=False):
+    """
+    @params: fish_ids default all, overwrite -- rewrite the day archives even if the batch files did not change
+    packs the filtered batches of every day into a compressed day archive in config.ARCHIVE_DIR
+    returns the bytes of the batch files and of the written day archives
+    """
+    if config.INPUT_BACKEND == "archive":
+        raise ValueError("set INPUT_BACKEND to csv or npz to export the archive")
+    fish2camera = get_fish2camera_map()
+    fish_ids = np.arange(len(fish2camera)) if fish_ids is None else fish_ids
+    source_bytes, archive_bytes = 0, 0
+    for camera, position in fish2camera[fish_ids]:
+        is_back = position == config.BACK
+        dir_ = get_directory(is_back=is_back)
+        for day in get_days_in_order(camera=camera, is_back=is_back):
+            filename = get_archive_filename(camera, day, is_back)
+            missing, duplicates, correct, corrupted = match_batch_files_of_the_day(
+                camera, day, is_back=is_back
+            )
+            keys = list(correct.keys())
+            files = [correct[k] for k in keys]
+            sources = [
+                [os.path.relpath(f, dir_), *get_source_signature(f).tolist()]
+                for f in files
+            ]
+            source_bytes += sum(s[1] for s in sources)
+            if (
+                not overwrite
+                and os.path.exists(filename)
+                and read_archive_meta(filename)["sources"] == sources
+            ):
+                archive_bytes += os.path.getsize(filename)
+                continue  # the day archive is up to date
+            batches = map_batch_files(
+                lambda f: read_batch_arrays(f, columns=ARCHIVE_COLUMNS)[0], files
+            )
+            meta = dict(
+                camera=camera,
+                day=day,
+                position=position,
+                batch_size=config.BATCH_SIZE,
+                sources=sources,
+                missing=missing,
+                duplicates=duplicates,
+                corrupted=corrupted,
+            )
+            write_day_archive(filename, keys, batches, meta)
+            archive_bytes += os.path.getsize(filename)
+            print("archived %s_%s %s: %d batches" % (camera, position, day, len(keys)))
+    if archive_bytes > 0:
+        print(
+            "archive %s: %.1f MB, batch files %.1f MB, ratio %.1f"
+            % (config.ARCHIVE_DIR, archive_bytes / 2**20, source_bytes / 2**20, source_bytes / archive_bytes)
+        )
+    return source_bytes, archive_bytes
+
+
+def import_archive():
+    """
+    restores the batch csv files of the day archives in config.ARCHIVE_DIR to config.dir_back and config.dir_front,
+    existing files are not overwritten. The csv files contain the columns FRAME;x;y;xpx;ypx;time of the archive.
+    returns the number of written csv files
+    """
+    n_files = 0
+    for is_back in [True, False]:
+        target = config.dir_back if is_back else config.dir_front
+        archive_dir = get_archive_directory(is_back)
+        if not os.path.isdir(archive_dir):
+            continue
+        for camera in sorted(os.listdir(archive_dir)):
+            for name in sorted(os.listdir("%s/%s" % (archive_dir, camera))):
+                archive_file = "%s/%s/%s" % (archive_dir, camera, name)
+                meta = read_archive_meta(archive_file)
+                for key, (source, *_) in zip(meta["keys"], meta["sources"]):
+                    filename = "%s/%s" % (target, source)
+                    if os.path.exists(filename):
+                        continue
+                    os.makedirs(os.path.dirname(filename), exist_ok=True)
+                    columns = read_archive_columns(
+                        "%s%s%s" % (archive_file, ARCHIVE_MEMBER_SEP, key),
+                        ARCHIVE_COLUMNS,
+                    )
+                    np.savetxt(
+                        filename,
+                        np.column_stack(columns),
+                        fmt=CSV_FORMATS,
+                        delimiter=config.sep,
+                        header="# Restored from %s\n%s"
+                        % (archive_file, config.sep.join(ARCHIVE_COLUMNS)),
+                        comments="",
+                    )
+                    n_files += 1
+    print("restored %d batch files" % n_files)
+    return n_files
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+import fishproviz.config as config
+
+BATCH_COLUMNS = ["FRAME", "x", "y", "xpx", "ypx", "time"]
+BATCH_CACHE_SUBDIR = "batches"
+
+
+def get_cache_filename(filename):
+    """returns the path of the cache file for a batch csv, keyed by its absolute path"""
+    key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+    return "%s/%s/%s.npz" % (config.CACHE_DIR, BATCH_CACHE_SUBDIR, key)
+
+
+def get_source_signature(filename):
+    """size and modification time of the source file, a changed file invalidates the cache"""
+    stat = os.stat(filename)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def read_batch_cache(filename):
+    """
+    @params: filename of the batch csv
+    returns the cached dataframe of the batch or None if there is no valid cache entry
+    """
+    cache_file = get_cache_filename(filename)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file, allow_pickle=False) as cached:
+            if str(cached["source"]) != os.path.abspath(filename) or not np.array_equal(
+                cached["signature"], get_source_signature(filename)
+            ):
+                return None
+            return pd.DataFrame({c: cached[c] for c in BATCH_COLUMNS})
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None  # corrupted or outdated cache file, it is overwritten on the next write
+
+
+def write_batch_cache(filename, df):
+    """writes the columns of a parsed batch into a binary cache file, the write is atomic"""
+    cache_file = get_cache_filename(filename)
+    tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            np.savez(
+                f,
+                source=np.array(os.path.abspath(filename)),
+                signature=get_source_signature(filename),
+                **{c: df[c].to_numpy() for c in BATCH_COLUMNS}
+            )
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print("WARNING: could not write batch cache for %s: %s" % (filename, e))
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
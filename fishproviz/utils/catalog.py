@@ -0,0 +1,213 @@
+import json
+import os
+import re
+import time
+from collections import defaultdict
+import fishproviz.config as config
+from .npz_reader import match_npz_files
+
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 1
+MTIME_RESOLUTION_NS = 2 * 10**9  # directories modified more recently are scanned again on the next run
+
+_catalog = None
+
+
+def is_camera_directory(name):
+    return len(name) == 8 and name.isnumeric()
+
+
+def is_day_directory(name):
+    return name[:8].isnumeric()
+
+
+def scan_directory(path):
+    """one os.scandir pass, returns the modification time and the names of the sub-directories and files"""
+    mtime = os.stat(path).st_mtime_ns
+    dirs, files = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                dirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    if time.time_ns() - mtime < MTIME_RESOLUTION_NS:
+        mtime = -1  # the directory might still change within the resolution of its mtime
+    return dict(mtime=mtime, dirs=sorted(dirs), files=sorted(files))
+
+
+def match_batch_files(c, d, files, n_files=15, min_idx=0):
+    """
+    @params:
+    c: camera_id
+    d: folder name of a day
+    files: list of files that are to be filtered
+    n_files: number of files to expect.
+    @Returns: missing_numbers, duplicate_f, correct_f, corrupted_f
+    correct_f: dict of the correct files for keys i in min_idx,...,n_files-1, for duplicates the LAST one
+    """
+    pattern = re.compile(
+        r".*{}_{}.{}(_back|_front)*_(\d{{6}})_\d*-\d*-\d*T\d*_\d*_\d*_\d*.csv".format(
+            c, d[:15], c
+        )
+    )
+    files_by_key = defaultdict(list)
+    for f in files:
+        match = pattern.match(f)
+        if match is not None:
+            files_by_key[match.group(2)].append(f)
+
+    missing_numbers = []
+    duplicate_f = []
+    correct_f = dict()
+    for i in range(min_idx, n_files):
+        key_i = "{:06d}".format(i)
+        i_f = files_by_key.get(key_i, [])
+        if len(i_f) > 1:
+            i_f.sort()
+            duplicate_f.extend(i_f[:-1])
+            correct_f[key_i] = i_f[-1]
+        elif len(i_f) == 0:
+            missing_numbers.append(key_i)
+        else:
+            correct_f[key_i] = i_f[-1]
+
+    pattern_general = re.compile(
+        r".*{}_{}.{}_\d*_\d*-\d*-\d*T\d*_\d*_\d*_\d*.csv".format(c, d[:15], c)
+    )
+    corrupted_f = [f for f in files if pattern_general.match(f) is None]
+    return missing_numbers, duplicate_f, correct_f, corrupted_f
+
+
+class DatasetCatalog:
+    """
+    Listing of the camera, day and batch directories below config.dir_front and config.dir_back.
+    Every directory is listed by a single os.scandir pass, the listing is persisted in config.CACHE_DIR
+    and on the next run only directories with a changed modification time are scanned again.
+    """
+
+    def __init__(self, roots, filename=None):
+        self.roots = [os.path.normpath(r) for r in roots]
+        self.filename = filename
+        self.directories = self.read()
+        self.n_scanned = 0
+        self.batch_files_of_day = dict()
+        visited = set()
+        for root in self.roots:
+            self.update(root, 0, visited)
+        stale = [p for p in self.directories if p not in visited]
+        for p in stale:
+            del self.directories[p]
+        if self.n_scanned > 0 or len(stale) > 0:
+            self.write()
+
+    def read(self):
+        if self.filename is None or not os.path.exists(self.filename):
+            return dict()
+        try:
+            with open(self.filename, "r") as f:
+                catalog = json.load(f)
+            if catalog.get("version") == CATALOG_VERSION:
+                return catalog["directories"]
+        except (OSError, ValueError):
+            pass
+        return dict()
+
+    def write(self):
+        if self.filename is None:
+            return
+        tmp_file = "%s.%d.tmp" % (self.filename, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(tmp_file, "w") as f:
+                json.dump(dict(version=CATALOG_VERSION, directories=self.directories), f)
+            os.replace(tmp_file, self.filename)
+        except OSError as e:
+            print("WARNING: could not write the dataset catalog %s: %s" % (self.filename, e))
+
+    def update(self, path, depth, visited):
+        """rescans path if it changed and descends into camera (depth 0) and day (depth 1) directories"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        entry = self.directories.get(path)
+        if entry is None or entry["mtime"] != mtime:
+            entry = scan_directory(path)
+            self.directories[path] = entry
+            self.n_scanned += 1
+        visited.add(path)
+        if depth < 2:
+            is_sub_directory = is_camera_directory if depth == 0 else is_day_directory
+            for name in entry["dirs"]:
+                if is_sub_directory(name):
+                    self.update(os.path.join(path, name), depth + 1, visited)
+
+    def lookup(self, path):
+        """returns the catalog entry of path, directories outside of the catalog are scanned without persisting"""
+        path = os.path.normpath(path)
+        if path not in self.directories:
+            self.directories[path] = scan_directory(path)
+        return self.directories[path]
+
+    def listdir(self, path):
+        entry = self.lookup(path)
+        return entry["dirs"] + entry["files"]
+
+    def batch_files(self, directory, camera, day, n_files=15, min_idx=0):
+        """
+        @params: directory of the position, camera, day, n_files, min_idx
+        returns the batch csv files of the day {camera}/{day}*/{camera}_{day}*.csv and their match_batch_files result
+        """
+        key = (os.path.normpath(directory), camera, day, n_files, min_idx)
+        if key not in self.batch_files_of_day:
+            camera_dir = "%s/%s" % (directory, camera)
+            files = []
+            for day_dir in self.lookup(camera_dir)["dirs"]:
+                if day_dir.startswith(day):
+                    files.extend(
+                        "%s/%s/%s" % (camera_dir, day_dir, f)
+                        for f in self.lookup("%s/%s" % (camera_dir, day_dir))["files"]
+                        if f.startswith("%s_%s" % (camera, day))
+                        and re.search(r"[0-9].*\.csv$", f[-6:])
+                    )
+            files = sorted(files)
+            self.batch_files_of_day[key] = (
+                files,
+                match_batch_files(camera, day, files, n_files=n_files, min_idx=min_idx),
+            )
+        return self.batch_files_of_day[key]
+
+    def npz_batch_files(self, directory, camera, day, n_files=15, min_idx=0):
+        """
+        @params: directory of the position, camera, day, n_files, min_idx
+        returns the batch npz files of the day {camera}/{day}*/NNNNNN.npz and their match_npz_files result
+        """
+        key = (os.path.normpath(directory), camera, day, n_files, min_idx, "npz")
+        if key not in self.batch_files_of_day:
+            camera_dir = "%s/%s" % (directory, camera)
+            files = []
+            for day_dir in self.lookup(camera_dir)["dirs"]:
+                if day_dir.startswith(day):
+                    files.extend(
+                        "%s/%s/%s" % (camera_dir, day_dir, f)
+                        for f in self.lookup("%s/%s" % (camera_dir, day_dir))["files"]
+                        if f.endswith(".npz")
+                    )
+            files = sorted(files)
+            self.batch_files_of_day[key] = (
+                files,
+                match_npz_files(files, n_files=n_files, min_idx=min_idx),
+            )
+        return self.batch_files_of_day[key]
+
+
+def get_catalog():
+    """returns the process wide catalog, it is rebuilt if config.dir_front or config.dir_back changed"""
+    global _catalog
+    roots = [os.path.normpath(r) for r in [config.dir_back, config.dir_front]]
+    if _catalog is None or _catalog.roots != roots:
+        _catalog = DatasetCatalog(
+            roots, filename="%s/%s" % (config.CACHE_DIR, CATALOG_FILE)
+        )
+    return _catalog
@@ -0,0 +1,135 @@
+import json
+import mmap
+import os
+import numpy as np
+import fishproviz.config as config
+from .archive import get_source_file
+from .batch_cache import get_source_signature
+from .utile import (
+    batch_files_of_the_day,
+    get_position_string,
+    map_batch_files,
+    read_batch_arrays,
+)
+
+DAY_STORE_SUBDIR = "days"
+FRAMES_FILE = "frames.npy"
+POSITIONS_FILE = "positions.npy"
+META_FILE = "day.json"
+
+
+def get_day_store_directory(camera, day, is_back=False, drop_out_of_scope=False):
+    fish_key = "%s_%s" % (camera, get_position_string(is_back))
+    name = "%s_dropped" % day if drop_out_of_scope else day
+    return "%s/%s/%s/%s" % (config.CACHE_DIR, DAY_STORE_SUBDIR, fish_key, name)
+
+
+def get_day_dtypes():
+    """returns the dtypes of the frames and positions of a day, int32 and float32 with COMPACT_DTYPES"""
+    if config.COMPACT_DTYPES:
+        return np.dtype(np.int32), np.dtype(np.float32)
+    return np.dtype(np.int64), np.dtype(np.float64)
+
+
+def real_array(a):
+    """returns a as float32 or float64 array for the compiled kernels, other dtypes are converted to float64"""
+    a = np.asarray(a)
+    return a if a.dtype in (np.float32, np.float64) else a.astype(np.float64)
+
+
+def concatenate_batches(keys, batches):
+    """
+    @params: keys, batches -- batch keys and the (FRAME, xpx, ypx) arrays of every batch of a day
+    returns frames, positions, offsets
+    frames: global frame index of the day FRAME + key * BATCH_SIZE
+    positions: Nx2 array of xpx, ypx
+    in the dtypes of get_day_dtypes
+    offsets: index of the first data frame of every batch in the concatenated arrays
+    """
+    frames_dtype, positions_dtype = get_day_dtypes()
+    offsets = np.cumsum([0, *[len(b[0]) for b in batches[:-1]]]).tolist()
+    frames = np.concatenate(
+        [b[0] + int(k) * config.BATCH_SIZE for k, b in zip(keys, batches)]
+    ).astype(frames_dtype)
+    positions = np.empty((frames.size, 2), dtype=positions_dtype)
+    positions[:, 0] = np.concatenate([b[1] for b in batches])
+    positions[:, 1] = np.concatenate([b[2] for b in batches])
+    return frames, positions, offsets
+
+
+def advise_will_need(*arrays):
+    """asks the kernel to read memory mapped arrays ahead, without copying them into memory"""
+    for array in arrays:
+        if isinstance(array, np.memmap) and hasattr(mmap, "MADV_WILLNEED"):
+            array._mmap.madvise(mmap.MADV_WILLNEED)
+
+
+def read_day_meta(directory):
+    try:
+        with open("%s/%s" % (directory, META_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_day_store(directory, frames, positions, meta):
+    """writes the arrays first and the sidecar last, a store without sidecar is never read"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp = ".%d.tmp" % os.getpid()
+        for name, array in [(FRAMES_FILE, frames), (POSITIONS_FILE, positions)]:
+            with open("%s/%s%s" % (directory, name, tmp), "wb") as f:
+                np.save(f, array)
+            os.replace("%s/%s%s" % (directory, name, tmp), "%s/%s" % (directory, name))
+        with open("%s/%s%s" % (directory, META_FILE, tmp), "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace("%s/%s%s" % (directory, META_FILE, tmp), "%s/%s" % (directory, META_FILE))
+    except OSError as e:
+        print("WARNING: could not write day store %s: %s" % (directory, e))
+
+
+def load_day(camera, day, is_back=False, drop_out_of_scope=False, print_logs=False):
+    """
+    @params: camera, day, is_back, drop_out_of_scope
+    returns keys, frames, positions of all filtered batches of the day
+    The concatenated arrays are stored as .npy files in config.CACHE_DIR and opened as read-only memory maps,
+    a change of the batch files of the day or of COMPACT_DTYPES rebuilds the store.
+    """
+    keys, filenames = batch_files_of_the_day(
+        camera, day, is_back=is_back, print_logs=print_logs
+    )
+    frames_dtype, positions_dtype = get_day_dtypes()
+    if len(keys) == 0:
+        return keys, np.empty(0, dtype=frames_dtype), np.empty((0, 2), dtype=positions_dtype)
+    files = [[f, *get_source_signature(get_source_file(f)).tolist()] for f in filenames]
+    directory = get_day_store_directory(camera, day, is_back, drop_out_of_scope)
+    if config.BATCH_CACHE:
+        meta = read_day_meta(directory)
+        if (
+            meta is not None
+            and meta["files"] == files
+            and meta["batch_size"] == config.BATCH_SIZE
+            and meta.get("dtypes") == [frames_dtype.str, positions_dtype.str]
+        ):
+            return (
+                meta["keys"],
+                np.load("%s/%s" % (directory, FRAMES_FILE), mmap_mode="r"),
+                np.load("%s/%s" % (directory, POSITIONS_FILE), mmap_mode="r"),
+            )
+    batches = map_batch_files(
+        lambda f: read_batch_arrays(
+            f, columns=["FRAME", "xpx", "ypx"], drop_errors=drop_out_of_scope
+        )[0],
+        filenames,
+    )  # only the columns needed for the metrics are parsed
+    frames, positions, offsets = concatenate_batches(keys, batches)
+    if config.BATCH_CACHE and frames.size > 0:
+        meta = dict(
+            keys=keys,
+            offsets=offsets,
+            files=files,
+            batch_size=config.BATCH_SIZE,
+            dtypes=[frames_dtype.str, positions_dtype.str],
+        )
+        write_day_store(directory, frames, positions, meta)
+    return keys, frames, positions
@@ -0,0 +1,124 @@
+import json
+import os
+import numpy as np
+import fishproviz.config as config
+from fishproviz.methods import distance_to_walls, grid_lookup
+from .day_store import real_array
+from .tank_area_config import get_wall_lines
+
+GRID_SUBDIR = "distance_grids"
+
+_grids = dict()
+
+
+def get_distance_grid_filename(fish_key):
+    return "%s/%s/%s.npz" % (config.CONFIG_DATA, GRID_SUBDIR, fish_key)
+
+
+def compute_distance_grid(fish_key, area, resolution):
+    """
+    rasterizes the signed distance to the closest wall line of the area, positive inside and negative outside of the area,
+    the grid covers the area and THRESHOLD_AREA_PX around it
+    returns grid (nx, ny) as float32, origin (x, y)
+    """
+    margin = config.THRESHOLD_AREA_PX + 2 * resolution
+    origin = area.min(axis=0) - margin
+    nx, ny = np.ceil((area.max(axis=0) + margin - origin) / resolution).astype(int) + 1
+    gx, gy = np.meshgrid(
+        origin[0] + np.arange(nx) * resolution,
+        origin[1] + np.arange(ny) * resolution,
+        indexing="ij",
+    )
+    from matplotlib.path import Path
+
+    points = np.column_stack([gx.ravel(), gy.ravel()])
+    dists = distance_to_walls(points, get_wall_lines(fish_key, area), config.KERNEL_THREADS)
+    inside = Path(area).contains_points(points)
+    grid = np.where(inside, dists, -dists).reshape(nx, ny).astype(np.float32)
+    return grid, origin
+
+
+def get_distance_grid(fish_key, area):
+    """
+    returns the signed distance grid of the area and its origin, kept in memory and in
+    CONFIG_DATA/distance_grids next to area_data.json, rasterized again if the area or DISTANCE_GRID_RESOLUTION changed
+    """
+    area = np.asarray(area, dtype=np.float64)
+    resolution = float(config.DISTANCE_GRID_RESOLUTION)
+    cached = _grids.get(fish_key)
+    if cached is not None and cached[0] == resolution and np.array_equal(cached[1], area):
+        return cached[2], cached[3]
+    filename = get_distance_grid_filename(fish_key)
+    try:
+        with np.load(filename) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if meta["resolution"] != resolution or not np.array_equal(meta["area"], area):
+                raise ValueError("outdated distance grid")
+            grid, origin = npz["grid"], np.array(meta["origin"])
+    except (OSError, ValueError, KeyError):
+        grid, origin = compute_distance_grid(fish_key, area, resolution)
+        meta = dict(resolution=resolution, area=area.tolist(), origin=origin.tolist())
+        tmp_file = "%s.%d.tmp.npz" % (filename[: -len(".npz")], os.getpid())
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            np.savez_compressed(tmp_file, meta=np.array(json.dumps(meta)), grid=grid)
+            os.replace(tmp_file, filename)
+        except OSError as e:
+            print("WARNING: could not write the distance grid %s: %s" % (filename, e))
+    _grids[fish_key] = (resolution, area, grid, origin)
+    return grid, origin
+
+
+def grid_distance(data, fish_key, area, select=None):
+    """
+    returns the distance grid interpolated at every point and the selected points outside of the grid,
+    NaN for the points outside of the grid or not selected
+    """
+    grid, origin = get_distance_grid(fish_key, area)
+    dists = grid_lookup(
+        data,
+        grid,
+        origin[0],
+        origin[1],
+        float(config.DISTANCE_GRID_RESOLUTION),
+        config.KERNEL_THREADS,
+        select,
+    )
+    missing = np.isnan(dists) & ~np.isnan(data).any(axis=1)
+    if select is not None:
+        missing &= select.view(bool)
+    return dists, missing
+
+
+def signed_wall_distance(data, fish_key, area, select=None):
+    """
+    @params: data (Nx2) in pixels, fish_key, area, select (N) optional points to compute, NaN for the others
+    returns the signed distance of every point to the closest wall line interpolated from the distance grid,
+    positive inside and negative outside of the area, -inf for the points outside of the grid,
+    which are more than THRESHOLD_AREA_PX outside of the area
+    """
+    select = None if select is None else np.ascontiguousarray(select, dtype=bool).view(np.uint8)
+    dists, missing = grid_distance(real_array(data), fish_key, area, select)
+    dists[missing] = -np.inf
+    return dists
+
+
+def wall_distance(data, fish_key, area, select=None):
+    """
+    @params: data (Nx2) in pixels, fish_key, area, select (N) optional points to compute, NaN for the others
+    returns the distance of every point to the closest wall line of the area in pixels,
+    with DISTANCE_GRID interpolated from the distance grid, points outside of the grid are computed exactly
+    """
+    data = real_array(data)
+    select = None if select is None else np.ascontiguousarray(select, dtype=bool).view(np.uint8)
+    if not config.DISTANCE_GRID:
+        return distance_to_walls(
+            data, get_wall_lines(fish_key, area), config.KERNEL_THREADS, select
+        )
+    dists, missing = grid_distance(data, fish_key, area, select)
+    dists = np.abs(dists)
+    if np.any(missing):
+        dists[missing] = distance_to_walls(
+            data, get_wall_lines(fish_key, area), config.KERNEL_THREADS, missing.view(np.uint8)
+        )[missing]
+    return dists
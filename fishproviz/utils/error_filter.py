@@ -1,7 +1,7 @@
 import numpy as np
 import fishproviz.config as config
-from fishproviz.methods import distance_to_wall_chunk, calc_steps
 from fishproviz.utils.transformation import px2cm
+from fishproviz.utils.distance_grid import wall_distance, signed_wall_distance
 
 
 def all_error_filters(data, area_tuple, **kwargs):
@@ -25,70 +25,80 @@ def error_default_points(data):
     return ((x == -1) & (y == -1)) | ((x == 0) & (y == 0)) | nan_filter
 
 
+def equal_position_runs(data):
+    """
+    run-length encoding of the sequences of equal consecutive positions
+    returns start, end of every sequence of at least two equal points data[start:end]
+    """
+    equal = np.all(data[1:] == data[:-1], axis=1)
+    changes = np.flatnonzero(np.diff(np.concatenate([[False], equal, [False]])))
+    return changes[0::2], changes[1::2] + 1
+
+
 def error_dirt_points(data, threshold=config.DIRT_THRESHOLD, fish_key="", day=""):  #
     """
     @params:    data -- numpy array with x,y coordinates
                 threshold -- number of data frames that are sequentially equal such that we classify them as dirt.
-    returns a boolean pandas array with all indices to filter set to True
+    returns a boolean numpy array with all indices to filter set to True
+    The dirt sequences that are not default points are written to config.err_file in one batch.
     """
-    bool_array = np.all(data[1:] == data[:-1], axis=1)
     flt = np.zeros(data.shape[0], dtype=bool)
-    indexer = np.argwhere(np.diff(bool_array)).squeeze()
-    start = 0
-    for end in [*(indexer + 2), data.shape[0]]:
-        if (
-            bool_array[start] and (end - start) > threshold
-        ):  # if the first element is true (hence it is a beginning of an equal sequence) and the difference is greater than the threshold
-            flt[start:end] = True
-            x, y = data[start]
-            if ~(((x == -1) & (y == -1)) | ((x == 0) & (y == 0))):
-                msg_spike_s, msg_spike_e = "", ""
-                if start > 0:
-                    spike_s = calc_steps(data[start - 1 : start + 1])[0]
-                    if px2cm(spike_s) > config.SPIKE_THRESHOLD:
-                        msg_spike_s = "SPIKE START"
-                if end < data.shape[0]:
-                    spike_e = calc_steps(data[end - 1 : end + 1])[0]
-                    if px2cm(spike_e) > config.SPIKE_THRESHOLD:
-                        msg_spike_e = "SPIKE END"
-                print(
-                    "DIRT: %s, %s: Found dirt: %d data points for [%d:%d] out of %d, data[start]=[%d,%d] \t %s \t %s"
-                    % (
-                        fish_key,
-                        day,
-                        end - start,
-                        start,
-                        end,
-                        data.shape[0],
-                        *data[start],
-                        msg_spike_s,
-                        msg_spike_e,
-                    ),
-                    "%.2f" % px2cm(spike_s),
-                    "%.2f" % px2cm(spike_e),
-                )
-                print(
-                    "dirt threshold: %.02f" % (threshold / (5 * 60)),
-                    "min",
-                    "Dirt Sequence %.02f" % ((end - start) / (5 * 60)),
-                    "min",
-                )
-                with open(config.err_file, "a") as f:
-                    f.write(
-                        ";".join(
-                            [
-                                fish_key,
-                                day,
-                                str((end - start) / (5 * 60)),
-                                str(data[start][0]),
-                                str(data[start][1]),
-                                str(start),
-                                str(end),
-                            ]
-                        )
-                        + "\n"
-                    )
-        start = end - 1
+    start, end = equal_position_runs(data)
+    is_dirt = (end - start) > threshold
+    start, end = start[is_dirt], end[is_dirt]
+    if start.size == 0:
+        return flt
+    bounds = np.zeros(data.shape[0] + 1, dtype=np.int64)
+    np.add.at(bounds, start, 1)
+    np.add.at(bounds, end, -1)
+    flt = np.cumsum(bounds[:-1]) > 0
+
+    x, y = data[start, 0], data[start, 1]
+    logged = ~(((x == -1) & (y == -1)) | ((x == 0) & (y == 0)))
+    start, end = start[logged], end[logged]
+    if start.size == 0:
+        return flt
+    # the steps into and out of the dirt sequence, NaN at the beginning and the end of the data
+    spike_s = np.full(start.size, np.nan)
+    has_s = start > 0
+    spike_s[has_s] = px2cm(
+        np.linalg.norm(data[start[has_s]] - data[start[has_s] - 1], axis=1)
+    )
+    spike_e = np.full(start.size, np.nan)
+    has_e = end < data.shape[0]
+    spike_e[has_e] = px2cm(
+        np.linalg.norm(data[end[has_e]] - data[end[has_e] - 1], axis=1)
+    )
+    n_spikes = np.sum(spike_s > config.SPIKE_THRESHOLD) + np.sum(spike_e > config.SPIKE_THRESHOLD)
+    print(
+        "DIRT: %s, %s: Found %d dirt sequences with %d data points out of %d, longest %.02f min (threshold %.02f min), %d spikes at start or end"
+        % (
+            fish_key,
+            day,
+            start.size,
+            np.sum(end - start),
+            data.shape[0],
+            np.max(end - start) / (5 * 60),
+            threshold / (5 * 60),
+            n_spikes,
+        )
+    )
+    with open(config.err_file, "a") as f:
+        f.writelines(
+            ";".join(
+                [
+                    fish_key,
+                    day,
+                    str((e - s) / (5 * 60)),
+                    str(data[s][0]),
+                    str(data[s][1]),
+                    str(s),
+                    str(e),
+                ]
+            )
+            + "\n"
+            for s, e in zip(start.tolist(), end.tolist())
+        )
     return flt
 
 
@@ -107,8 +117,11 @@ def error_points_out_of_range(data, area_tuple):
     return error_out_of_range
 
 
-def error_points_out_of_area(data, area_tuple, day=""):
-    """returns a boolean np.array, where true indecates weather the corresponding datapoint is on the wrong side of the tank"""
+def error_points_over_diagonal(data, area_tuple, err_default):
+    """
+    exact area filter: the points on the other side of the diagonal more than THRESHOLD_AREA_PX away from the wall lines
+    and the points out of range, without the default points
+    """
     key, area = area_tuple
     is_back = config.BACK in key  # key in the shape of <<camera>>_<<position>>
     error_out_of_range = error_points_out_of_range(data, area_tuple)
@@ -123,14 +136,28 @@ def error_points_out_of_area(data, area_tuple, day=""):
         error_filter = (
             AP[:, 1] * AB[0] - AP[:, 0] * AB[1] >= 0
         )  # cross product (a1b2−a2b1)
-    error_filter = error_filter
 
-    err_default = error_default_points(data)
     error_non_default = error_filter & ~err_default
-    error_non_default[error_non_default] = (
-        distance_to_wall_chunk(data[error_non_default], area) > config.THRESHOLD_AREA_PX
+    # the distance only of the points on the other side, NaN for the others
+    error_non_default = (
+        wall_distance(data, key, area, select=error_non_default)
+        > config.THRESHOLD_AREA_PX
     )  # in pixels
-    error_non_default = error_non_default | (error_out_of_range & ~err_default)
+    return error_non_default | (error_out_of_range & ~err_default)
+
+
+def error_points_out_of_area(data, area_tuple, day=""):
+    """returns a boolean np.array, where true indecates weather the corresponding datapoint is on the wrong side of the tank"""
+    key, area = area_tuple
+    err_default = error_default_points(data)
+    if config.DISTANCE_GRID:
+        # inside or outside from the sign of the distance grid, no per point diagonal and range test
+        error_non_default = (
+            signed_wall_distance(data, key, area, select=~err_default)
+            < -config.THRESHOLD_AREA_PX
+        )  # in pixels
+    else:
+        error_non_default = error_points_over_diagonal(data, area_tuple, err_default)
     if np.any(error_non_default):  # ef and not ed
         print(
             "AREA: %s, %s %d dataframes out of %d where on the other side of the tank. They are beeing filtered out."
@@ -0,0 +1,53 @@
+import os
+
+# process wide registry of the tank geometry: areas, calibrations, feeding patches and maze ellipses
+_entries = dict()  # name -> (signature of the source files, value)
+_derived = dict()  # data derived from the entries, cleared when an entry is loaded again
+
+
+def files_signature(files):
+    """paths, sizes and modification times of the files, None for missing files"""
+    signature = []
+    for f in sorted(files):
+        try:
+            stat = os.stat(f)
+            signature.append((f, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append((f, None, None))
+    return signature
+
+
+def get_entry(name, files, load):
+    """
+    @params: name of the entry, files -- source files of the entry, load -- function to read the entry
+    returns the value of the entry, loaded on first use and again when one of the files changed
+    """
+    signature = files_signature(files)
+    cached = _entries.get(name)
+    if cached is None or cached[0] != signature:
+        cached = (signature, load())
+        _entries[name] = cached
+        _derived.clear()
+    return cached[1]
+
+
+def get_derived(key, compute):
+    """returns the data derived from the geometry for key, computed once until an entry is loaded again"""
+    if key not in _derived:
+        _derived[key] = compute()
+    return _derived[key]
+
+
+def registry_state():
+    """returns the loaded entries, to initialize the registry of worker processes with restore_registry"""
+    return dict(_entries)
+
+
+def restore_registry(state):
+    _entries.update(state)
+    _derived.clear()
+
+
+def clear_registry():
+    _entries.clear()
+    _derived.clear()
@@ -0,0 +1,96 @@
+import re
+import numpy as np
+
+NPZ_BATCH_PATTERN = re.compile(r"^(\d{6})\.npz$")
+TRAJECTORY_KEYS = ["FRAME", "xpx", "ypx"]
+
+_warned_directories = set()
+
+
+def is_npz_batch(filename):
+    return NPZ_BATCH_PATTERN.match(filename) is not None
+
+
+def is_trajectory_npz(filename):
+    """
+    returns True if the .npz file holds the tracked trajectory (FRAME, xpx, ypx),
+    the frame index files of the image store (frame_number, frame_time) have the same names
+    """
+    try:
+        with np.load(filename) as npz:
+            return all(k in npz.files for k in TRAJECTORY_KEYS)
+    except (OSError, ValueError):
+        return False
+
+
+def warn_once(directory, message):
+    if directory not in _warned_directories:
+        _warned_directories.add(directory)
+        print("WARNING: %s" % message)
+
+
+def match_npz_files(files, n_files=15, min_idx=0):
+    """
+    @params:
+    files: list of the .npz files of the day directories {day}*/NNNNNN.npz
+    n_files: number of files to expect.
+    @Returns: missing_numbers, duplicate_f, correct_f, corrupted_f as match_batch_files
+    correct_f: dict of the correct files for keys i in min_idx,...,n_files-1, for duplicates the LAST one
+    """
+    files_by_key = dict()
+    for f in files:
+        match = NPZ_BATCH_PATTERN.match(f.split("/")[-1])
+        if match is not None:
+            files_by_key.setdefault(match.group(1), []).append(f)
+
+    missing_numbers = []
+    duplicate_f = []
+    correct_f = dict()
+    for i in range(min_idx, n_files):
+        key_i = "{:06d}".format(i)
+        i_f = sorted(files_by_key.get(key_i, []))
+        if len(i_f) == 0:
+            missing_numbers.append(key_i)
+            continue
+        duplicate_f.extend(i_f[:-1])
+        correct_f[key_i] = i_f[-1]
+    corrupted_f = [f for f in files if not is_npz_batch(f.split("/")[-1])]
+    return missing_numbers, duplicate_f, correct_f, corrupted_f
+
+
+def read_batch_npz(filename, columns=["FRAME", "xpx", "ypx"], drop_errors=False):
+    """
+    @params: filename, columns, drop_errors
+    returns the same as read_batch_arrays for a batch stored as .npz with one array per column
+    Rows with NaN in one of the columns are skipped, the default points (-1,-1) and (0,0) are flagged,
+    with drop_errors they are skipped except the last row, which records the last frame of the batch.
+    """
+    with np.load(filename) as npz:
+        missing = [c for c in columns if c not in npz.files]
+        if len(missing) > 0:
+            raise ValueError(
+                "%s does not contain the columns %s" % (filename, ", ".join(missing))
+            )
+        values = [np.asarray(npz[c], dtype=np.float64) for c in columns]
+    return filter_batch_columns(values, columns, drop_errors)
+
+
+def filter_batch_columns(values, columns, drop_errors=False):
+    """
+    @params: values -- one array per column, columns, drop_errors
+    returns arrays, errors with the error semantics of read_batch_arrays, FRAME as int64
+    """
+    valid = np.logical_and.reduce([~np.isnan(v) for v in values])
+    values = [v[valid] for v in values]
+    errors = np.zeros(valid.sum(), dtype=bool)
+    if "xpx" in columns and "ypx" in columns:
+        x, y = values[columns.index("xpx")], values[columns.index("ypx")]
+        errors = ((x == -1) & (y == -1)) | ((x == 0) & (y == 0))
+    if drop_errors and errors.size > 0:
+        keep = ~errors
+        keep[-1] = True
+        values, errors = [v[keep] for v in values], errors[keep]
+    arrays = [
+        v.astype(np.int64) if c == "FRAME" else v for v, c in zip(values, columns)
+    ]
+    return arrays, errors
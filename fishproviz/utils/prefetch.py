@@ -0,0 +1,109 @@
+import queue
+import threading
+import numpy as np
+import pandas as pd
+import fishproviz.config as config
+
+_DONE = object()
+
+
+def get_nbytes(data):
+    """estimated memory of loaded data: numpy arrays, dataframes and tuples or lists of them"""
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True).sum())
+    if isinstance(data, (list, tuple)):
+        return sum(get_nbytes(d) for d in data)
+    return 0
+
+
+class Prefetcher:
+    """
+    Iterator over (item, load(item)) in the order of items. A background thread loads up to depth items ahead,
+    loading pauses while the loaded but not yet processed data exceed max_bytes, at least one item is always loaded.
+    """
+
+    def __init__(self, items, load, depth=None, max_bytes=None):
+        self.items = list(items)
+        self.load = load
+        self.depth = config.PREFETCH_DEPTH if depth is None else depth
+        self.max_bytes = (
+            config.PREFETCH_MAX_MB * 2**20 if max_bytes is None else max_bytes
+        )
+        self.queue = queue.Queue(maxsize=max(self.depth, 1))
+        self.bytes_in_queue = 0
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = None
+
+    def __iter__(self):
+        if self.depth <= 0:  # no read-ahead
+            for item in self.items:
+                yield item, self.load(item)
+            return
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        try:
+            while True:
+                entry = self.queue.get()
+                if entry is _DONE:
+                    return
+                item, data, nbytes, error = entry
+                with self.condition:
+                    self.bytes_in_queue -= nbytes
+                    self.condition.notify()
+                if error is not None:
+                    raise error
+                yield item, data
+        finally:
+            self.stop()
+
+    def run(self):
+        for item in self.items:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.stopped
+                    or (
+                        self.queue.qsize() < self.depth
+                        and (self.bytes_in_queue == 0 or self.bytes_in_queue < self.max_bytes)
+                    )
+                )
+                if self.stopped:
+                    return
+            try:
+                data, error = self.load(item), None
+            except Exception as e:  # raised in the consuming thread
+                data, error = None, e
+            nbytes = get_nbytes(data)
+            with self.condition:
+                self.bytes_in_queue += nbytes
+            if not self.put((item, data, nbytes, error)) or error is not None:
+                return
+        self.put(_DONE)
+
+    def put(self, entry):
+        while not self.stopped:
+            try:
+                self.queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def prefetch(items, load, depth=None, max_bytes=None):
+    """
+    @params: items -- work items e.g. (fish, day), load -- function to load the data of an item
+    depth: number of items loaded ahead, default config.PREFETCH_DEPTH, 0 to load sequentially
+    max_bytes: memory cap for the loaded items waiting to be processed, default config.PREFETCH_MAX_MB
+    returns an iterator over (item, data), the next items are loaded while the current one is processed
+    """
+    return iter(Prefetcher(items, load, depth=depth, max_bytes=max_bytes))
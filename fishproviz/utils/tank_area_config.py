@@ -1,39 +1,80 @@
 
 import glob, json, os
-import matplotlib.pyplot as plt
 import numpy as np
 import fishproviz.config as config
+from fishproviz.methods import wall_lines
+from . import geometry
 from .utile import get_camera_pos_keys
 
 
-def get_area_functions():
-    """returns a function to deliver the area, given a fish_key"""
+def get_area_files():
+    """the area csv files and the data directories, the missing areas are filled for the cameras found there"""
+    return [
+        *glob.glob("%s/*.csv" % config.area_front),
+        *glob.glob("%s/*.csv" % config.area_back),
+        config.dir_front,
+        config.dir_back,
+    ]
+
+
+def load_areas():
     try:
         area_data = get_areas()
         for k in area_data.keys():
             area_data[k] = np.array(area_data[k])
-        return lambda key: area_data[key]
+        return area_data
     except Exception as e:
         print(e, " program will run without area data")
+        return None
+
+
+def get_area_functions():
+    """
+    returns a function to deliver the area, given a fish_key,
+    the areas are loaded once per process and again when the area files change
+    """
+    area_data = geometry.get_entry("areas", get_area_files(), load_areas)
+    if area_data is None:
         return lambda key: None
+    return lambda key: area_data[key]
 
 
-def get_calibration_functions():
-    calibration_file = f"{config.CONFIG_DATA}/calibration.json"
+def get_wall_lines(fish_key, area):
+    """returns the wall lines of the area (methods.wall_lines), computed once per fish_key and area"""
+    cached = geometry.get_derived(("wall_lines", fish_key), dict)
+    if "area" not in cached or not np.array_equal(cached["area"], area):
+        cached["area"] = np.array(area, dtype=np.float64)
+        cached["lines"] = wall_lines(cached["area"])
+    return cached["lines"]
+
+
+def get_calibration_file():
+    return f"{config.CONFIG_DATA}/calibration.json"
+
+
+def load_calibrations():
+    calibration_file = get_calibration_file()
     if not os.path.exists(calibration_file):
         try:
-            calibration = compute_calibrations()
+            return compute_calibrations()
         except Exception as e:
             print(
                 e,
                 "will use default calibration of %s px/cm"
                 % (config.DEFAULT_CALIBRATION),
             )
-            return lambda cam: config.DEFAULT_CALIBRATION
-    else:
-        f = open(calibration_file, "r")
-        calibration = json.load(f)
-        f.close()
+            return None
+    with open(calibration_file, "r") as f:
+        return json.load(f)
+
+
+def get_calibration_functions():
+    """returns a function to deliver the calibration in px/cm, given a fish_key, loaded as the areas"""
+    calibration = geometry.get_entry(
+        "calibrations", [get_calibration_file()], load_calibrations
+    )
+    if calibration is None:
+        return lambda cam: config.DEFAULT_CALIBRATION
     return lambda cam: calibration[cam.split("_")[0]]
 
 
@@ -1,10 +1,8 @@
 import numpy as np
+from . import geometry
 from .tank_area_config import get_area_functions, get_calibration_functions
 import fishproviz.config as config
 
-FUNCS_PX2CM = None
-AREA_FUNCS = None
-
 
 def normalize_origin_of_compartment(data, area, is_back):
     if is_back:
@@ -24,36 +22,65 @@ def rotation(t):
     return np.array([[np.cos(t), -np.sin(t)], [np.sin(t), np.cos(t)]])
 
 
-def px2cm(a, fish_key=None):
-    global FUNCS_PX2CM
-    if not FUNCS_PX2CM:
-        FUNCS_PX2CM = get_calibration_functions()
+def get_scale(fish_key=None):
+    """returns the calibration of the fish in px/cm, config.DEFAULT_CALIBRATION without fish_key"""
     if fish_key:
-        return a * FUNCS_PX2CM(fish_key)
-    return a * config.DEFAULT_CALIBRATION
+        return get_calibration_functions()(fish_key)
+    return config.DEFAULT_CALIBRATION
 
 
-def pixel_to_cm(pixels, fish_key=None):
+class CoordinateTransform:
     """
-    @params: pixels (Nx2)
-    returns: cm (Nx2)
+    pixel to cm transform of a fish: cm = (pixels - origin) @ rotation * scale,
+    the scale is applied after the rotation to keep the rounding of the angles at +-pi
     """
-    global FUNCS_PX2CM
-    global AREA_FUNCS
-    if not AREA_FUNCS:
-        AREA_FUNCS = get_area_functions()
-    if AREA_FUNCS(fish_key) is None:
+
+    def __init__(self, origin, scale):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.scale = scale
+        self.rotation = rotation(np.pi / 4)
+
+    def to_cm(self, pixels, out=None, select=None):
+        """
+        @params: pixels (Nx2), out optional output array, pixels itself to transform in place,
+        select (N) optional boolean mask, only the selected points are copied and transformed
+        returns: cm (Nx2) or (len(select.nonzero())x2), float32 for float32 pixels and float64 otherwise
+        """
+        pixels = np.asarray(pixels)
+        dtype = np.float32 if pixels.dtype == np.float32 else np.float64  # float32 of COMPACT_DTYPES is kept
+        if select is None:
+            shifted = np.subtract(pixels, self.origin.astype(dtype), dtype=dtype)
+        else:
+            shifted = pixels[select].astype(dtype, copy=False)  # the filter copy is shifted in place
+            np.subtract(shifted, self.origin.astype(dtype), out=shifted)
+        out = np.matmul(shifted, self.rotation.astype(dtype), out=out)
+        return np.multiply(out, dtype(self.scale), out=out)
+
+
+def build_transform(fish_key):
+    area = get_area_functions()(fish_key)
+    if area is None:
         origin = np.array([450, 450])  # default origin
     else:
-        origin = AREA_FUNCS(fish_key)[1]  # origin of the area is the second point
-    pixels = pixels - origin
-    if not FUNCS_PX2CM:
-        FUNCS_PX2CM = get_calibration_functions()
-    R = rotation(np.pi / 4)
-    if fish_key:
-        t = [FUNCS_PX2CM(fish_key), FUNCS_PX2CM(fish_key)]
-    else:
-        t = [config.DEFAULT_CALIBRATION, config.DEFAULT_CALIBRATION]
-    T = np.diag(t)
-    cm_data = pixels @ R @ T
-    return cm_data
+        origin = area[1]  # origin of the area is the second point
+    return CoordinateTransform(origin, get_scale(fish_key))
+
+
+def get_transform(fish_key=None):
+    """returns the CoordinateTransform of the fish, built once per fish_key and kept with the geometry"""
+    # reloads the areas and calibrations if their files changed, which clears the transforms built from them
+    get_area_functions()
+    get_calibration_functions()
+    return geometry.get_derived(("transform", fish_key), lambda: build_transform(fish_key))
+
+
+def px2cm(a, fish_key=None):
+    return a * get_scale(fish_key)
+
+
+def pixel_to_cm(pixels, fish_key=None, out=None):
+    """
+    @params: pixels (Nx2), out optional output array as in CoordinateTransform.to_cm
+    returns: cm (Nx2)
+    """
+    return get_transform(fish_key).to_cm(pixels, out=out)
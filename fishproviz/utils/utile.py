@@ -1,13 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from time import gmtime, strftime
 import pandas as pd
 import numpy as np
-import re
 import os
 from os import path, makedirs
-import glob
 from itertools import product
 import fishproviz.config as config
+from fishproviz.utils.geometry import registry_state, restore_registry
+from fishproviz.methods import parse_batch_columns
+from .batch_cache import BATCH_COLUMNS, read_batch_cache, write_batch_cache
+from .catalog import get_catalog, match_batch_files
+from .npz_reader import is_trajectory_npz, read_batch_npz, warn_once
+from .archive import (
+    get_archive_directory,
+    get_archive_filename,
+    is_archive_batch,
+    match_archive_batches,
+    read_batch_archive,
+)
+
+INPUT_BACKENDS = ["csv", "npz", "archive"]
 
 
 def flatten_list(list_of_lists):
@@ -41,6 +54,8 @@ def get_interval_name_from_seconds(seconds):
 def get_directory(is_back=None):
     if is_back is None:
         raise Exception("define kwargs is_back")
+    if config.INPUT_BACKEND == "archive":  # the day archives replace the day directories
+        return get_archive_directory(is_back)
     if is_back:
         return config.dir_back
     else:
@@ -50,7 +65,11 @@ def get_directory(is_back=None):
 def get_camera_names(is_back=False):
     dir_ = get_directory(is_back)
     return sorted(
-        [name for name in os.listdir(dir_) if len(name) == 8 and name.isnumeric()]
+        [
+            name
+            for name in get_catalog().listdir(dir_)
+            if len(name) == 8 and name.isnumeric()
+        ]
     )
 
 
@@ -93,7 +112,7 @@ def get_days_in_order(interval=None, is_back=None, camera=None):
     dir_ = get_directory(is_back)
     days = [
         name[:15]
-        for name in os.listdir(dir_ + "/" + camera)
+        for name in get_catalog().listdir(dir_ + "/" + camera)
         if verify_day_directory(name, camera)
     ]
     days_unique = sorted(list(set(days)))
@@ -175,15 +194,55 @@ def get_position_string(is_back):
         return config.FRONT
 
 
-def read_batch_csv(filename, drop_errors):
-    df = pd.read_csv(
-        filename,
-        skiprows=3,
-        delimiter=";",
-        usecols=["x", "y", "FRAME", "time", "xpx", "ypx"],
-        dtype={"xpx": np.float64, "ypx": np.float64, "time": np.float64},
+def read_batch_arrays(filename, columns=["FRAME", "xpx", "ypx"], drop_errors=False):
+    """
+    @params: filename, columns, drop_errors
+    returns a list with one numpy array per column and a boolean array which is True for default points (-1,-1) and (0,0)
+    Only the given columns are parsed, rows with an empty value in one of them are skipped.
+    With drop_errors the default points are skipped except the last row, which records the last frame of the batch.
+    The batches of the npz and archive backends are read by read_batch_npz and read_batch_archive.
+    """
+    if is_archive_batch(filename):
+        return read_batch_archive(filename, columns=columns, drop_errors=drop_errors)
+    if filename.endswith(".npz"):
+        return read_batch_npz(filename, columns=columns, drop_errors=drop_errors)
+    with open(filename, "rb") as f:
+        buf = f.read()
+    start = 0
+    while buf.startswith(b"#", start):  # comment lines of the tracker
+        start = buf.index(b"\n", start) + 1
+    header_end = buf.find(b"\n", start)
+    if header_end == -1:
+        header_end = len(buf)
+    header = buf[start:header_end].decode().strip().split(";")
+    column_idx = np.array([header.index(c) for c in columns], dtype=np.int64)
+    ix, iy = [columns.index(c) if c in columns else -1 for c in ["xpx", "ypx"]]
+    values, errors = parse_batch_columns(
+        buf, header_end + 1, column_idx, ix=ix, iy=iy, drop_errors=drop_errors
     )
-    df.dropna(axis="rows", how="any", inplace=True)
+    arrays = [
+        values[:, j].astype(np.int64) if c == "FRAME" else values[:, j].copy()
+        for j, c in enumerate(columns)
+    ]
+    return arrays, errors
+
+
+def parse_batch_csv(filename):
+    arrays, _ = read_batch_arrays(filename, columns=BATCH_COLUMNS)
+    return pd.DataFrame(dict(zip(BATCH_COLUMNS, arrays)))
+
+
+def read_batch_csv(filename, drop_errors):
+    """
+    @params: filename, drop_errors
+    returns the parsed batch, the binary cache in config.CACHE_DIR is consulted first if config.BATCH_CACHE is set
+    """
+    use_cache = config.BATCH_CACHE and filename.endswith(".csv")  # binary batches are not cached
+    df = read_batch_cache(filename) if use_cache else None
+    if df is None:
+        df = parse_batch_csv(filename)
+        if use_cache:
+            write_batch_cache(filename, df)
     if drop_errors:
         err_filter = get_error_indices(df[:-1])
         df = df.drop(index=df[:-1][err_filter].index)
@@ -204,12 +263,33 @@ def get_error_indices(dataframe):
     return indexNames
 
 
-def merge_files(filenames, drop_errors):
-    batches = []
-    for f in filenames:
-        df = read_batch_csv(f, drop_errors)
-        batches.append(df)
-    return batches
+def map_batch_files(read, filenames, n_threads=None):
+    """
+    @params: read -- function applied to each file, filenames, n_threads default config.LOAD_THREADS
+    returns the list of results in the order of filenames, for n_threads > 1 the files are read in a bounded thread pool
+    """
+    n_threads = config.LOAD_THREADS if n_threads is None else n_threads
+    if n_threads <= 1 or len(filenames) <= 1:
+        return [read(f) for f in filenames]
+    with ThreadPoolExecutor(max_workers=min(n_threads, len(filenames))) as pool:
+        return list(pool.map(read, filenames))
+
+
+def init_worker(config_values, geometry):
+    """initializer of the worker processes, starts them with the configuration and the geometry of the parent process"""
+    config.restore_config(config_values)
+    restore_registry(geometry)
+
+
+def worker_initargs():
+    """returns the initargs of init_worker for a process pool started from this process"""
+    return config.config_state(), registry_state()
+
+
+def merge_files(filenames, drop_errors, n_threads=None):
+    return map_batch_files(
+        lambda f: read_batch_csv(f, drop_errors), filenames, n_threads=n_threads
+    )
 
 
 def csv_of_the_day(
@@ -219,37 +299,80 @@ def csv_of_the_day(
     drop_out_of_scope=False,
     batch_keys_remove=[],
     print_logs=False,
+    n_threads=None,
 ):
     """
-    @params: camera, day, is_back, drop_out_of_scope
+    @params: camera, day, is_back, drop_out_of_scope, n_threads to read the batches concurrently
     returns csv of the day for camera: front or back
     """
+    file_keys, correct_files = batch_files_of_the_day(
+        camera,
+        day,
+        is_back=is_back,
+        batch_keys_remove=batch_keys_remove,
+        print_logs=print_logs,
+    )
+    return file_keys, merge_files(correct_files, drop_out_of_scope, n_threads=n_threads)
+
 
+def batch_files_of_the_day(
+    camera, day, is_back=False, batch_keys_remove=[], print_logs=False
+):
+    """
+    @params: camera, day, is_back
+    returns the batch keys and the filtered batch files of the day for camera: front or back
+    """
     dir_ = get_directory(is_back=is_back)
+    missing_numbers, duplicate_f, filtered_files, corrupted_f = match_batch_files_of_the_day(
+        camera, day, is_back=is_back
+    )  # filters for duplicates in the batches for a day. It takes the LAST one!!!
+    LOG = get_filter_messages(missing_numbers, duplicate_f, corrupted_f)
+    file_keys = [k for k in filtered_files.keys() if k not in batch_keys_remove]
+    correct_files = [filtered_files[k] for k in file_keys]
+    if print_logs and len(LOG) > 0:
+        print("\n {}/{}/{}*: \n".format(dir_, camera, day), "\n".join(LOG))
+    return file_keys, correct_files
 
-    filenames_f = [
-        f
-        for f in glob.glob(
-            "{}/{}/{}*/{}_{}*.csv".format(dir_, camera, day, camera, day),
-            recursive=True,
+
+def match_batch_files_of_the_day(camera, day, is_back=False):
+    """
+    @params: camera, day, is_back
+    returns missing_numbers, duplicate_f, correct_f, corrupted_f for the batches of the day
+    The batches are the csv files, for config.INPUT_BACKEND npz the NNNNNN.npz files of the day
+    (days without trajectory npz files fall back to the csv files) and for archive the batches of the day archive.
+    """
+    if config.INPUT_BACKEND not in INPUT_BACKENDS:
+        raise ValueError(
+            "INPUT_BACKEND %s is not one of %s" % (config.INPUT_BACKEND, INPUT_BACKENDS)
         )
-        if re.search(r"[0-9].*\.csv$", f[-6:])
-    ]
-    filenames_f = sorted(filenames_f)
-    LOG, _, filtered_files = filter_files(
+    if config.INPUT_BACKEND == "archive":
+        return match_archive_batches(get_archive_filename(camera, day, is_back))
+    dir_ = get_directory(is_back=is_back)
+    batch_files = get_catalog().batch_files
+    if config.INPUT_BACKEND == "npz":
+        npz_files, _ = get_catalog().npz_batch_files(
+            dir_,
+            camera,
+            day,
+            n_files=config.MAX_BATCH_IDX + 1,
+            min_idx=config.MIN_BATCH_IDX,
+        )
+        if len(npz_files) > 0 and is_trajectory_npz(npz_files[0]):
+            batch_files = get_catalog().npz_batch_files
+        else:
+            warn_once(
+                "%s/%s/%s" % (dir_, camera, day),
+                "no trajectory npz files in %s/%s/%s*, reading the csv files"
+                % (dir_, camera, day),
+            )
+    _, matched = batch_files(
+        dir_,
         camera,
         day,
-        filenames_f,
         n_files=config.MAX_BATCH_IDX + 1,
         min_idx=config.MIN_BATCH_IDX,
-    )  # filters for duplicates in the batches for a day. It takes the LAST one!!!
-    for key in batch_keys_remove:
-        filtered_files.pop(key, None)
-    file_keys = list(filtered_files.keys())
-    correct_files = list(filtered_files.values())
-    if print_logs and len(LOG) > 0:
-        print("\n {}/{}/{}*: \n".format(dir_, camera, day), "\n".join(LOG))
-    return file_keys, merge_files(correct_files, drop_out_of_scope)
+    )
+    return matched
 
 
 def filter_files(c, d, files, n_files=15, min_idx=0, Logger=None):
@@ -265,53 +388,38 @@ def filter_files(c, d, files, n_files=15, min_idx=0, Logger=None):
     duplicate_f: a list of all duplicates occurring
     correct_f: dict of the correct files for keys i in 0,...,n_files-1
     """
+    missing_numbers, duplicate_f, correct_f, corrupted_f = match_batch_files(
+        c, d, files, n_files=n_files, min_idx=min_idx
+    )
     msg_counter = 0
-    missing_numbers = []
-    duplicate_f = []
-    correct_f = dict()
-    for i in range(min_idx, n_files):
-        key_i = "{:06d}".format(i)
-        pattern = re.compile(
-            ".*{}_{}.{}(_back|_front)*_{}_\d*-\d*-\d*T\d*_\d*_\d*_\d*.csv".format(c, d[:15], c, key_i)
-        )
-        i_f = [f for f in files if pattern.match(f) is not None]
-
-        if len(i_f) > 1:
-            i_f.sort()
-            duplicate_f.extend(i_f[:-1])
-            correct_f[key_i] = i_f[-1]
-        elif len(i_f) == 0:
-            missing_numbers.append(key_i)
-        else:
-            correct_f[key_i] = i_f[-1] # takes the last one
+    if Logger:
+        for msg in get_filter_messages(missing_numbers, duplicate_f, corrupted_f):
+            msg_counter += 1
+            Logger.debug(msg)
+    return msg_counter, duplicate_f, correct_f
 
-    pattern_general = re.compile(
-        ".*{}_{}.{}_\d*_\d*-\d*-\d*T\d*_\d*_\d*_\d*.csv".format(c, d[:15], c)
-    )
-    corrupted_f = [f for f in files if pattern_general.match(f) is None]
 
-    if Logger and len(missing_numbers) > 0:
-        msg_counter += 1
-        Logger.debug(
+def get_filter_messages(missing_numbers, duplicate_f, corrupted_f):
+    LOG = []
+    if len(missing_numbers) > 0:
+        LOG.append(
             "The following files are missing: \n \t\t\t\t{}".format(
                 " ".join(missing_numbers)
             )
         )
-    if Logger and len(duplicate_f) > 0:
-        msg_counter += 1
-        Logger.debug(
+    if len(duplicate_f) > 0:
+        LOG.append(
             "The following files are duplicates: \n\t\t\t\t{}".format(
                 "\n\t".join(duplicate_f)
             )
         )
-    if Logger and len(corrupted_f) > 0:
-        msg_counter += 1
-        Logger.debug(
+    if len(corrupted_f) > 0:
+        LOG.append(
             "The following file names are corrupted, maybe wrong folder: \n\t\t\t\t{}".format(
                 "\n\t".join(corrupted_f)
             )
         )
-    return msg_counter, duplicate_f, correct_f
+    return LOG
 
 
 def get_timestamp(format="%d-%m-%Y_%H:%M:%S"):
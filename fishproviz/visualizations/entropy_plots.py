@@ -3,7 +3,7 @@ import numpy as np
 import plotly.graph_objects as go
 from .activity_plotting import get_filepath_metric_plot
 import fishproviz.config as config
-from fishproviz.metrics.metrics import entropy_for_chunk
+from fishproviz.metrics.compute_metrics import entropy_for_chunk
 from fishproviz.utils.tank_area_config import get_area_functions
 from fishproviz.utils import (
     csv_of_the_day,
@@ -4,8 +4,7 @@ import os, inspect
 import json
 import numpy as np
 import argparse
-from fishproviz.metrics.exploration_trials import exploration_trials
-from fishproviz.utils import get_camera_pos_keys
+import fishproviz.config as config
 from fishproviz.config import (
     DIR_CSV_LOCAL,
     HOURS_PER_DAY,
@@ -14,16 +13,8 @@ from fishproviz.config import (
     RESULTS_PATH,
     create_directories,
 )
-from fishproviz.trajectory import Trajectory, FeedingTrajectory
-from fishproviz.metrics import (
-    activity_per_interval,
-    turning_angle_per_interval,
-    tortuosity_per_interval,
-    entropy_per_interval,
-    distance_to_wall_per_interval,
-    absolute_angle_per_interval,
-)
 
+# the programs import their modules when they run, clear or --help start without pandas, scipy and matplotlib
 TRAJECTORY = "trajectory"
 FEEDING = "feeding"
 TRIAL_TIMES = "trial_times"
@@ -35,8 +26,11 @@ ENTROPY = "entropy"
 WALL_DISTANCE = "wall_distance"
 ALL_METRICS = "all"
 CLEAR = "clear"
+EXPORT_ARCHIVE = "export_archive"
+IMPORT_ARCHIVE = "import_archive"
 metric_names = [ACTIVITY, TURNING_ANGLE, ABS_ANGLE, TORTUOSITY, ENTROPY, WALL_DISTANCE]
-programs = [TRAJECTORY, FEEDING, TRIAL_TIMES, *metric_names, ALL_METRICS, CLEAR]
+programs = [TRAJECTORY, FEEDING, TRIAL_TIMES, *metric_names, ALL_METRICS, CLEAR, EXPORT_ARCHIVE, IMPORT_ARCHIVE]
+ALL_FISH_PROGRAMS = [CLEAR, IMPORT_ARCHIVE, TRIAL_TIMES]  # run without a fish_id
 
 
 def main_metrics(program, time_interval=100, include_median=None, **kwargs_metrics):
@@ -61,11 +55,20 @@ def main_metrics(program, time_interval=100, include_median=None, **kwargs_metri
     if time_interval < 30:
         raise ValueError("time_interval must be at least 30 seconds otherwise the csv files will be too large")
 
-    if include_median and program != ACTIVITY:
+    if include_median and program not in [ACTIVITY, ALL_METRICS]:
         raise ValueError("include_median is only valid for activity")
 
     kwargs_metrics.update(time_interval=time_interval)
-    
+    from fishproviz.metrics import (
+        activity_per_interval,
+        turning_angle_per_interval,
+        tortuosity_per_interval,
+        entropy_per_interval,
+        distance_to_wall_per_interval,
+        absolute_angle_per_interval,
+        all_metrics_per_interval,
+    )
+
     metric_functions = {
         ACTIVITY: activity_per_interval,
         TORTUOSITY: tortuosity_per_interval,
@@ -73,6 +76,7 @@ def main_metrics(program, time_interval=100, include_median=None, **kwargs_metri
         ABS_ANGLE: absolute_angle_per_interval,
         ENTROPY: entropy_per_interval,
         WALL_DISTANCE: distance_to_wall_per_interval,
+        ALL_METRICS: all_metrics_per_interval,  # all metrics in one pass over the data
     }
 
     if program not in metric_functions:
@@ -90,6 +94,8 @@ def get_fish_ids_to_run(program, fish_id):
         fish_id: int
     returns: np-array of ids
     '''
+    from fishproviz.utils import get_camera_pos_keys
+
     fish_keys = get_camera_pos_keys()
 
     n_fishes = len(fish_keys)
@@ -109,6 +115,56 @@ def get_fish_ids_to_run(program, fish_id):
     return fish_ids
 
 
+def run_trajectory(program, fish_ids, parallel, kwargs_metrics):
+    from fishproviz.trajectory import Trajectory
+
+    T = Trajectory(
+        parallel = json.loads(
+            str(parallel).lower()
+        )
+    )
+    T.plots_for_tex(fish_ids)
+
+
+def run_feeding(program, fish_ids, parallel, kwargs_metrics):
+    from fishproviz.trajectory import FeedingTrajectory
+
+    FT = FeedingTrajectory()
+    FT.plots_for_tex(fish_ids)
+    FT.feeding_data_to_csv()
+    FT.feeding_data_to_tex()
+
+
+def run_trial_times(program, fish_ids, parallel, kwargs_metrics):
+    from fishproviz.metrics.exploration_trials import exploration_trials
+
+    exploration_trials()
+
+
+def run_metrics(program, fish_ids, parallel, kwargs_metrics):
+    main_metrics(program, **kwargs_metrics)
+
+
+def run_export_archive(program, fish_ids, parallel, kwargs_metrics):
+    from fishproviz.utils.archive_export import export_archive
+
+    export_archive(fish_ids)
+
+
+def run_import_archive(program, fish_ids, parallel, kwargs_metrics):
+    from fishproviz.utils.archive_export import import_archive
+
+    import_archive()
+
+
+def run_clear(program, fish_ids, parallel, kwargs_metrics):
+    """clear all data remove directories DANGEROUS!"""
+    for path in [PLOTS_DIR, RESULTS_PATH]:  # VIS_DIR
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            print("Removed directory: %s" % path)
+
+
 def main(
     program=None,
     time_interval=100,
@@ -116,6 +172,9 @@ def main(
     include_median=None,
     parallel=False,
     print_logs=False,
+    load_threads=None,
+    workers=None,
+    incremental=False,
 ):
     """
     params:  
@@ -123,41 +182,39 @@ def main(
         time_interval: int 
         fish_id: int
         include_median: bool
+        load_threads: int, number of threads to read the batch files of a day, default config.LOAD_THREADS
+        workers: int, number of processes to compute the metrics, default config.WORKERS
+        incremental: bool, only compute the fish-days that changed since the last run of the metric
         kwargs for the programs activity, turning_angle
     """
-    fish_ids = get_fish_ids_to_run(program, fish_id)
+    if load_threads is not None:
+        config.LOAD_THREADS = load_threads
+    if workers is not None:
+        config.WORKERS = workers
+    # programs for all fish, the camera directories are not listed
+    fish_ids = None if program in ALL_FISH_PROGRAMS else get_fish_ids_to_run(program, fish_id)
     kwargs_metrics = dict(
         fish_ids=fish_ids,
         time_interval=time_interval,
         write_to_csv=True,
         include_median=include_median,
         print_logs=print_logs,
+        incremental=incremental,
     )
     # PROGRAM METRICS or TRAJECTORY or CLEAR
-    if program == TRAJECTORY:
-        T = Trajectory(
-            parallel = json.loads(
-                str(parallel).lower()
-            )
-        )
-        T.plots_for_tex(fish_ids)
-    elif program == FEEDING:
-        FT = FeedingTrajectory()
-        FT.plots_for_tex(fish_ids)
-        FT.feeding_data_to_csv()
-        FT.feeding_data_to_tex()
-    elif program == TRIAL_TIMES:
-        exploration_trials()
-    elif program in metric_names:
-        main_metrics(program, **kwargs_metrics)
-    elif program == ALL_METRICS:
-        for p in metric_names:
-            main_metrics(p, **kwargs_metrics)
-    elif program == CLEAR:  # clear all data remove directories DANGEROUS!
-        for path in [PLOTS_DIR, RESULTS_PATH]:  # VIS_DIR
-            if os.path.isdir(path):
-                shutil.rmtree(path)
-                print("Removed directory: %s" % path)
+    program_functions = {
+        TRAJECTORY: run_trajectory,
+        FEEDING: run_feeding,
+        TRIAL_TIMES: run_trial_times,
+        **{name: run_metrics for name in [*metric_names, ALL_METRICS]},
+        EXPORT_ARCHIVE: run_export_archive,
+        IMPORT_ARCHIVE: run_import_archive,
+        CLEAR: run_clear,
+    }
+    if program not in program_functions:
+        print("TERMINATED: Invalid program")
+        return -1
+    program_functions[program](program, fish_ids, parallel, kwargs_metrics)
     return None
 
 
@@ -206,6 +263,26 @@ def set_args():
         help="Print logs from duplicate file detection other file missmatches",
         action="store_true",
     )
+    parser.add_argument(
+        "-lt",
+        "--load_threads",
+        help="Number of threads to read the batch files of a day concurrently, default LOAD_THREADS of config.env",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of processes to compute the metrics of the fish-days in parallel, default WORKERS of config.env",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "-inc",
+        "--incremental",
+        help="Only compute the fish-days whose batch files or config changed since the last run and merge them into the existing csv files",
+        action="store_true",
+    )
     args = parser.parse_args()
     return args
 
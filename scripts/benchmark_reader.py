@@ -0,0 +1,61 @@
+"""
+Benchmark of the batch csv readers on the batches in test_data:
+    python3 -m scripts.benchmark_reader [--repeat 5] [--path test_data]
+pandas:     pandas.read_csv as used by read_batch_csv before the projected reader
+projected:  read_batch_arrays with the columns FRAME, xpx, ypx needed by the metrics
+all:        read_batch_arrays with the six columns of read_batch_csv
+"""
+import argparse
+import glob
+import os
+import time
+import numpy as np
+import pandas as pd
+from fishproviz.utils.batch_cache import BATCH_COLUMNS
+from fishproviz.utils.utile import read_batch_arrays
+
+
+def read_pandas(filename):
+    df = pd.read_csv(
+        filename,
+        skiprows=3,
+        delimiter=";",
+        usecols=["x", "y", "FRAME", "time", "xpx", "ypx"],
+        dtype={"xpx": np.float64, "ypx": np.float64, "time": np.float64},
+    )
+    df.dropna(axis="rows", how="any", inplace=True)
+    return df
+
+
+def benchmark(files, read, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for f in files:
+            read(f)
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python3 -m scripts.benchmark_reader")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--path",
+        type=str,
+        default=os.path.join(os.path.dirname(__file__), "..", "test_data"),
+    )
+    args = parser.parse_args()
+    files = sorted(glob.glob("%s/*/[0-9]*/[0-9]*/[0-9]*.csv" % args.path))  # position/camera/day/batch
+    n_rows = sum(len(read_pandas(f)) for f in files)
+    readers = {
+        "pandas": read_pandas,
+        "projected": lambda f: read_batch_arrays(f, columns=["FRAME", "xpx", "ypx"]),
+        "all": lambda f: read_batch_arrays(f, columns=BATCH_COLUMNS),
+    }
+    print("%d files, %d rows, best of %d runs" % (len(files), n_rows, args.repeat))
+    t_pandas = None
+    for name, read in readers.items():
+        t = benchmark(files, read, args.repeat)
+        t_pandas = t_pandas or t
+        print("%-10s %8.3f sec %6.2fx" % (name, t, t_pandas / t))
@@ -38,6 +38,22 @@ DIRT_FILTER=0 # 1 to filter by dirt, 0 to not filter
 SPIKE_THRESHOLD=8  # In centimeters. to consider a step as a spike (alternative definition MEAN_GLOBAL + 3 * SD_GLOBAL)
 DIRT_THRESHOLD=300  # Threshold for dirt detection, indicates the number of consecutive frames that, when equal, are classified as dirt.
 THRESHOLD_AREA_PX=50  # The threshold in pixels for the exclusion of data points that are not within the area of the tank.
+ENTROPY_DEBUG_PLOTS=0 # 1 to print and plot the points dropped by the entropy of every interval, otherwise they are summarized at the end of the run and written to <interval>_entropy_dropped_points.csv
+DISTANCE_GRID=0 # 1 to interpolate the wall distances (wall_distance metric and area filter) from a signed distance grid of every area, cached in CONFIG_DATA/distance_grids, 0 to compute them exactly per wall
+DISTANCE_GRID_RESOLUTION=2 # Cell size of the distance grid in pixels, the interpolation error is below the cell size
+
+# CACHE
+BATCH_CACHE=1 # 1 to cache parsed csv batches in CACHE_DIR, 0 to always parse the csv files
+STATS_STORE=1 # 1 to store the metric statistics per STATS_BASE_INTERVAL in CACHE_DIR and merge them for coarser time intervals, 0 to compute every time interval from the data
+STATS_BASE_INTERVAL=10 # Base interval in seconds of the statistics store, time intervals that are a multiple of it (30, 100, hour, day) are merged from the store
+# LOADING
+INPUT_BACKEND="csv" # csv, npz to read the NNNNNN.npz files next to the csv files (days without trajectory npz files are read from the csv files) or archive to read the day archives in ARCHIVE_DIR
+LOAD_THREADS=1 # Number of threads to read the batch files of a day concurrently, e.g. 8 for network mounted data, 1 to read sequentially
+PREFETCH_DEPTH=1 # Number of days loaded in the background while the current day is processed, 0 to disable
+PREFETCH_MAX_MB=2048 # Memory cap in MB for the days loaded ahead
+WORKERS=1 # Number of processes to compute the metrics of the fish-days in parallel, e.g. the number of cores
+KERNEL_THREADS=1 # Number of OpenMP threads of the compiled kernels per process (build with FISHPROVIZ_OPENMP=1 python setup.py build_ext --inplace), keep WORKERS * KERNEL_THREADS at most the number of cores
+COMPACT_DTYPES=0 # 1 to store and process the positions of a day as float32 and the frames as int32, half the memory per fish-day, the results differ by the float32 rounding of the cm coordinates
 
 # shared variables that are used in the scripts
 # NO Changes needed
@@ -48,6 +64,8 @@ P_TRAJECTORY="trajectory"
 CONFIG_DATA="config_data" # To stroe the config data, feeding times, area coordinates, calibration, etc.
 RESULTS="results" # To store the results of the analysis
 TEX_DIR="tex" # To store the tex files
+CACHE_DIR="cache" # To store the binary cache of parsed csv batches
+ARCHIVE_DIR="archive" # Compressed day archives written by python3 main.py export_archive
 
 export rootserver
 export path_csv
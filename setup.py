@@ -10,11 +10,17 @@ if not os.path.exists(env):
     shutil.copyfile(env_default, env)
 
 
+# build the kernels with OpenMP: FISHPROVIZ_OPENMP=1 python setup.py build_ext --inplace
+# the number of threads is set by KERNEL_THREADS in config.env
+openmp_args = ["-fopenmp"] if os.environ.get("FISHPROVIZ_OPENMP", "0") == "1" else []
+
 extensions = [
     Extension(
         "fishproviz.methods",
         ["fishproviz/methods.pyx"],
         include_dirs=[numpy.get_include()],
+        extra_compile_args=openmp_args,
+        extra_link_args=openmp_args,
         # define_macros=[('NPY_NO_DEPRECATED_API', 'NPY_1_7_API_VERSION')]
     )
 ]
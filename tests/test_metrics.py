@@ -4,6 +4,7 @@ import fishproviz.config as config
 import fishproviz.metrics as metrics
 import unittest
 import numpy as np
+import json
 import os
 import time
 
@@ -59,6 +60,276 @@ class TestUtils(unittest.TestCase):
         )
         print("Time taken: %.02f seconds" % (time.time() - t))
 
+    def test_all_metrics_one_pass(self):
+        packages = metrics.all_metrics_per_interval(
+            fish_ids=self.fish_ids, time_interval=100
+        )
+        for package, metric_per_interval in zip(
+            packages,
+            [
+                metrics.activity_per_interval,
+                metrics.turning_angle_per_interval,
+                metrics.absolute_angle_per_interval,
+                metrics.tortuosity_per_interval,
+                metrics.entropy_per_interval,
+                metrics.distance_to_wall_per_interval,
+            ],
+        ):
+            expected = metric_per_interval(fish_ids=self.fish_ids, time_interval=100)
+            assert package["metric_name"] == expected["metric_name"]
+            for fish_key, days in expected["results"].items():
+                for day, df in days.items():
+                    assert df.equals(package["results"][fish_key][day]), (
+                        "%s differs for %s %s" % (package["metric_name"], fish_key, day)
+                    )
+
+    def test_stats_store(self):
+        stats_store = config.STATS_STORE
+        try:
+            for time_interval in [100, 60**2]:
+                config.STATS_STORE = 0
+                expected = metrics.all_metrics_per_interval(
+                    fish_ids=self.fish_ids, time_interval=time_interval
+                )
+                config.STATS_STORE = 1
+                # the first run writes the statistics, the second merges the stored ones
+                for _ in range(2):
+                    packages = metrics.all_metrics_per_interval(
+                        fish_ids=self.fish_ids, time_interval=time_interval
+                    )
+                    for package, exp in zip(packages, expected):
+                        for fish_key, days in exp["results"].items():
+                            for day, df in days.items():
+                                result = package["results"][fish_key][day]
+                                assert (result.index == df.index).all()
+                                assert np.allclose(
+                                    result.values, df.values, equal_nan=True
+                                ), "%s differs for %s %s" % (
+                                    package["metric_name"],
+                                    fish_key,
+                                    day,
+                                )
+        finally:
+            config.STATS_STORE = stats_store
+
+    def test_incremental_metrics(self):
+        from fishproviz.metrics.results_to_csv import (
+            get_filename_for_metric_csv,
+            get_fingerprints_filename,
+        )
+
+        metrics.all_metrics_per_interval(
+            fish_ids=self.fish_ids, time_interval=3600, write_to_csv=True
+        )
+        filenames = [
+            get_filename_for_metric_csv(name, "hour")
+            for name in ["activity", "tortuosity", "entropy"]
+        ]
+        expected = [open(f).read() for f in filenames]
+        # outdate one fish-day, only this one is computed again
+        fingerprints_file = get_fingerprints_filename("entropy", "hour")
+        with open(fingerprints_file) as f:
+            fingerprints = json.load(f)
+        fish_key = list(fingerprints.keys())[0]
+        fingerprints[fish_key][list(fingerprints[fish_key].keys())[0]] = "outdated"
+        with open(fingerprints_file, "w") as f:
+            json.dump(fingerprints, f)
+        packages = metrics.all_metrics_per_interval(
+            fish_ids=self.fish_ids,
+            time_interval=3600,
+            write_to_csv=True,
+            incremental=True,
+        )
+        assert len(packages) == 6
+        for f, content in zip(filenames, expected):
+            assert open(f).read() == content, "%s changed" % f
+
+    def test_parallel_metrics(self):
+        sequential = metrics.all_metrics_per_interval(fish_ids=self.fish_ids, time_interval=100)
+        parallel = metrics.all_metrics_per_interval(
+            fish_ids=self.fish_ids, time_interval=100, workers=2
+        )
+        for package_s, package_p in zip(sequential, parallel):
+            for fish_key, days in package_s["results"].items():
+                # same days in the same order
+                assert list(days.keys()) == list(package_p["results"][fish_key].keys())
+                for day, df in days.items():
+                    assert df.equals(package_p["results"][fish_key][day])
+
+    def test_compact_dtypes(self):
+        from fishproviz.utils.day_store import load_day
+
+        compact = config.COMPACT_DTYPES
+        try:
+            config.COMPACT_DTYPES = 0
+            expected = metrics.all_metrics_per_interval(fish_ids=self.fish_ids, time_interval=100)
+            config.COMPACT_DTYPES = 1
+            packages = metrics.all_metrics_per_interval(fish_ids=self.fish_ids, time_interval=100)
+            _, frames, positions = load_day("23442333", "20220712_060000", is_back=True)
+            assert frames.dtype == np.int32 and positions.dtype == np.float32
+        finally:
+            config.COMPACT_DTYPES = compact
+        for package, exp in zip(packages, expected):
+            if package["metric_name"] == "turning_angle":
+                continue  # exact reversals may round to +pi or -pi
+            for fish_key, days in exp["results"].items():
+                for day, df in days.items():
+                    result = package["results"][fish_key][day]
+                    assert np.allclose(result.values, df.values, rtol=1e-4, equal_nan=True)
+
+    def test_segmented_mean_std(self):
+        rng = np.random.default_rng(0)
+        values = rng.random(10000)
+        values[7] = np.nan
+        error_index = rng.random(values.size) < 0.2
+        # empty intervals and split indices beyond the data as produced by searchsorted
+        split_index = np.array([0, 100, 100, 2500, 9999, 10000, 10500])
+        for f, include_median in [
+            (metrics.metrics.mean_std, False),
+            (metrics.metrics.mean_std_median, True),
+        ]:
+            expected = np.zeros([len(split_index) + 1, 4 if include_median else 3])
+            for i, (chunk, err) in enumerate(
+                zip(np.split(values, split_index), np.split(error_index, split_index))
+            ):
+                chunk = chunk[~err]
+                expected[i, :-1] = f(chunk)
+                expected[i, -1] = len(chunk)
+            result = metrics.metrics.segmented_mean_std(
+                values, split_index, error_index, include_median=include_median
+            )
+            assert np.allclose(result, expected, rtol=1e-12, atol=0, equal_nan=True)
+
+    def test_tortuosity_of_intervals(self):
+        from fishproviz.methods import (
+            mean_std,
+            tortuosity_of_chunk,
+            tortuosity_of_intervals,
+        )
+
+        # straight line: every segment of 10cm has a tortuosity of 1
+        line = np.column_stack([np.arange(50, dtype=float), np.zeros(50)])
+        assert np.allclose(tortuosity_of_chunk(line), 1.0)
+        data = np.cumsum(np.random.default_rng(0).normal(size=(3000, 2)), axis=0)
+        error_index = np.zeros(len(data), dtype=bool)
+        error_index[1000:1100] = True
+        split_index = np.array([700, 1500, 1502])
+        result = metrics.tortuosity(data, split_index, error_index)
+        for i, (chunk, err) in enumerate(
+            zip(np.split(data, split_index), np.split(error_index, split_index))
+        ):
+            expected = mean_std(tortuosity_of_chunk(chunk[~err]))
+            assert np.allclose(result[i, :2], expected, equal_nan=True)
+            assert result[i, 2] == (~err).sum()
+        assert tortuosity_of_intervals(
+            data, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        ).shape == (0, 3)
+
+    def test_compute_kinematics(self):
+        from fishproviz.metrics.metrics import (
+            update_filter_two_points,
+            update_filter_three_points,
+        )
+
+        rng = np.random.default_rng(1)
+        data = np.round(np.cumsum(rng.normal(size=(1000, 2)) * 3, axis=0))
+        data[20:30] = data[19]  # equal consecutive points
+        data[50] = np.nan
+        filter_index = rng.random(len(data)) < 0.05
+        kinematics = metrics.compute_kinematics(data, filter_index)
+        steps = metrics.compute_step_lengths(data)
+        assert np.array_equal(kinematics["steps"], steps, equal_nan=True)
+        assert np.allclose(kinematics["angles"], metrics.compute_turning_angles(data))
+        assert np.array_equal(
+            kinematics["error_two"], update_filter_two_points(steps, filter_index)
+        )
+        assert np.array_equal(
+            kinematics["error_three"],
+            update_filter_three_points(steps, filter_index),
+        )
+
+    def test_distance_to_walls(self):
+        from fishproviz.methods import distance_to_walls, wall_lines
+        from fishproviz.utils.tank_area_config import get_wall_lines
+
+        area = np.array([[0, 0], [100, 0], [100, 50], [0, 50]], dtype=float)
+        data = np.array([[10, 20], [50, 45], [99, 1], [np.nan, np.nan]])
+        lines = get_wall_lines("test_front", area)
+        assert lines is get_wall_lines("test_front", area.copy())
+        assert np.array_equal(lines, wall_lines(area))
+        dists = distance_to_walls(data, lines)
+        assert np.allclose(dists[:3], [10, 5, 1]) and np.isnan(dists[3])
+        select = np.array([True, False, True, False])
+        dists = distance_to_walls(data, lines, 1, select.view(np.uint8))
+        assert np.allclose(dists[select], [10, 1]) and np.all(np.isnan(dists[~select]))
+
+    def test_kernel_threads(self):
+        from fishproviz.methods import distance_to_walls, tortuosity_of_intervals, wall_lines
+        from fishproviz.metrics.interval_stats import valid_segments
+
+        rng = np.random.default_rng(2)
+        data = np.cumsum(rng.normal(size=(5000, 2)), axis=0)
+        split_index = np.sort(rng.choice(np.arange(1, len(data)), 40, replace=False))
+        error_index = rng.random(len(data)) < 0.02
+        segments = valid_segments(data, split_index, error_index)
+        lines = wall_lines(np.array([[-80, -80], [80, -80], [80, 80], [-80, 80]], dtype=float))
+        select = (rng.random(len(data)) < 0.5).view(np.uint8)
+        for threads in [2, 4]:
+            assert np.array_equal(
+                tortuosity_of_intervals(*segments, threads),
+                tortuosity_of_intervals(*segments, 1),
+                equal_nan=True,
+            )
+            assert np.array_equal(
+                distance_to_walls(data, lines, threads, select),
+                distance_to_walls(data, lines, 1, select),
+                equal_nan=True,
+            )
+
+    def test_interval_entropy(self):
+        from fishproviz.metrics.interval_stats import (
+            interval_histograms,
+            interval_entropies,
+        )
+
+        area = np.array([[100, 100], [900, 120], [880, 700], [120, 650]], dtype=float)
+        rng = np.random.default_rng(0)
+        data = rng.uniform(0, 1100, size=(5000, 2))
+        data[0, 0] = area[:, 0].max() + config.THRESHOLD_AREA_PX  # on the right edge
+        error_index = rng.random(len(data)) < 0.05
+        split_index = np.array([1000, 1000, 2500])
+        histograms, counts = interval_histograms(data, split_index, error_index, area)
+        result = metrics.entropy(data, split_index, error_index, ("1_back", area))
+        for i, (chunk, err) in enumerate(
+            zip(np.split(data, split_index), np.split(error_index, split_index))
+        ):
+            assert np.array_equal(histograms[i], metrics.entropy_heatmap(chunk[~err], area))
+            expected = metrics.entropy_for_chunk(chunk[~err], ("1_back", area))
+            assert np.allclose(result[i, 0], expected, equal_nan=True)
+            assert result[i, 1] == (~err).sum()
+        multi_scale = interval_entropies(
+            data, split_index, error_index, ("1_back", area), ((18, 18), (9, 9))
+        )
+        assert multi_scale.shape == (4, 3)
+        assert np.allclose(multi_scale[:, 0], result[:, 0], equal_nan=True)
+
+    def test_entropy_dropped_points(self):
+        import tempfile
+        from fishproviz.metrics import diagnostics
+
+        area = np.array([[100, 100], [900, 120], [880, 700], [120, 650]], dtype=float)
+        data = np.random.default_rng(0).uniform([120, 120], [880, 650], size=(3000, 2))
+        data[:5] = [5000, 5000]  # out of the histogram range
+        error_index = np.zeros(len(data), dtype=bool)
+        diagnostics.pop_dropped_points()
+        metrics.entropy(data, np.array([1000, 2000]), error_index, ("1_back", area), day="d")
+        with tempfile.TemporaryDirectory() as tmp:
+            df = diagnostics.report_dropped_points(f"{tmp}/dropped_points.csv")
+            assert os.path.exists(f"{tmp}/dropped_points.csv")
+        assert df.loc[df["interval"] == 0, "out_of_range"].item() == 5
+        assert (df["out_of_compartment"] > 0).all() and (df["day"] == "d").all()
+        assert diagnostics.report_dropped_points() is None
+
     def test_compute_turning_angles(self):
         # Test 1
         points1 = np.array([[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1]], dtype=float)
@@ -0,0 +1,326 @@
+import fishproviz
+import fishproviz.config as config
+from fishproviz.utils import utile, batch_cache, day_store, catalog, prefetch, npz_reader
+from fishproviz.utils import archive, archive_export, distance_grid, transformation, geometry
+import unittest
+import glob
+import json
+import numpy as np
+import os
+import tempfile
+
+fpv_path = os.path.dirname(os.path.dirname(fishproviz.__file__))
+
+
+class TestBatchLoading(unittest.TestCase):
+    config.set_config_paths(f"{fpv_path}/test_data")
+    config.dir_front = f"{fpv_path}/test_data/front"
+    config.dir_back = f"{fpv_path}/test_data/back"
+    batch_files = sorted(glob.glob(f"{fpv_path}/test_data/back/*/*/*.csv"))
+
+    def test_batch_cache(self):
+        filename = self.batch_files[0]
+        parsed = utile.parse_batch_csv(filename).reset_index(drop=True)
+        batch_cache.write_batch_cache(filename, parsed)
+        cached = batch_cache.read_batch_cache(filename)
+        assert cached is not None, "cache entry was not written"
+        assert cached.equals(parsed), "cached batch differs from the csv"
+        assert list(cached.dtypes) == list(parsed.dtypes)
+        # a changed source file invalidates the cache entry
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        try:
+            assert batch_cache.read_batch_cache(filename) is None
+        finally:
+            os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    def test_concurrent_loading(self):
+        files = self.batch_files[:8]
+        sequential = utile.merge_files(files, True, n_threads=1)
+        concurrent = utile.merge_files(files, True, n_threads=4)
+        assert len(sequential) == len(concurrent)
+        for a, b in zip(sequential, concurrent):  # the order of the files is kept
+            assert a.equals(b)
+
+    def test_day_store(self):
+        camera, day = "23442333", "20220712_060000"
+        keys, batches = utile.csv_of_the_day(camera, day, is_back=True)
+        frames, positions, _ = day_store.concatenate_batches(
+            keys, [(b.FRAME.to_numpy(), b.xpx.to_numpy(), b.ypx.to_numpy()) for b in batches]
+        )
+        for _ in range(2):  # build the store, then read the memory map
+            keys_s, frames_s, positions_s = day_store.load_day(camera, day, is_back=True)
+            assert keys_s == keys
+            assert np.array_equal(frames_s, frames)
+            assert np.array_equal(positions_s, positions)
+        assert isinstance(frames_s, np.memmap)
+
+    def test_catalog_rescan(self):
+        camera, day = "23442333", "20220712_060000"
+        with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as cache:
+            day_dir = f"{root}/{camera}/{day}.{camera}"
+            os.makedirs(day_dir)
+            name = f"{camera}_{day}.{camera}_%06d_2022-09-15T01_29_12_1.csv"
+            open(f"{day_dir}/{name % 0}", "w").close()
+            for d in [day_dir, f"{root}/{camera}", root]:
+                os.utime(d, ns=(0, 10**9))
+            catalog_file = f"{cache}/catalog.json"
+            c = catalog.DatasetCatalog([root], filename=catalog_file)
+            assert c.n_scanned == 3
+            assert catalog.DatasetCatalog([root], filename=catalog_file).n_scanned == 0
+            open(f"{day_dir}/{name % 1}", "w").close()
+            os.utime(day_dir, ns=(0, 2 * 10**9))
+            c = catalog.DatasetCatalog([root], filename=catalog_file)
+            assert c.n_scanned == 1, "only the changed day directory is scanned"
+            _, (missing, duplicates, correct, corrupted) = c.batch_files(
+                root, camera, day, n_files=3
+            )
+            assert list(correct.keys()) == ["000000", "000001"]
+            assert missing == ["000002"]
+
+    def test_prefetch(self):
+        items = list(range(10))
+
+        def load(i):
+            return np.full(100, i)
+
+        for depth, max_bytes in [(0, None), (1, None), (4, None), (4, 1)]:
+            result = list(prefetch.prefetch(items, load, depth=depth, max_bytes=max_bytes))
+            assert [i for i, _ in result] == items, "the order of the items is kept"
+            assert all(np.all(data == i) for i, data in result)
+
+        def failing_load(i):
+            if i == 3:
+                raise ValueError("corrupted day")
+            return i
+
+        loaded = []
+        with self.assertRaises(ValueError):
+            for i, _ in prefetch.prefetch(items, failing_load, depth=2):
+                loaded.append(i)
+        assert loaded == [0, 1, 2]
+
+    def test_npz_backend(self):
+        filename = self.batch_files[0]
+        with tempfile.TemporaryDirectory() as tmp:
+            arrays, _ = utile.read_batch_arrays(filename, columns=batch_cache.BATCH_COLUMNS)
+            npz_file = f"{tmp}/000000.npz"
+            np.savez(npz_file, **dict(zip(batch_cache.BATCH_COLUMNS, arrays)))
+            assert npz_reader.is_trajectory_npz(npz_file)
+            for drop_errors in [False, True]:
+                csv_arrays, csv_errors = utile.read_batch_arrays(filename, drop_errors=drop_errors)
+                npz_arrays, npz_errors = utile.read_batch_arrays(npz_file, drop_errors=drop_errors)
+                assert np.array_equal(csv_errors, npz_errors)
+                for a, b in zip(csv_arrays, npz_arrays):
+                    assert a.dtype == b.dtype and np.array_equal(a, b)
+        # the npz files of test_data are frame indexes of the image store, the csv files are read instead
+        camera, day = "23442333", "20220712_060000"
+        assert not npz_reader.is_trajectory_npz(
+            glob.glob(f"{fpv_path}/test_data/back/{camera}/{day}*/000000.npz")[0]
+        )
+        keys, files = utile.batch_files_of_the_day(camera, day, is_back=True)
+        config.INPUT_BACKEND = "npz"
+        try:
+            assert utile.batch_files_of_the_day(camera, day, is_back=True) == (keys, files)
+        finally:
+            config.INPUT_BACKEND = "csv"
+
+    def test_archive(self):
+        camera, day = "23442333", "20220712_060000"
+        keys, batches = utile.csv_of_the_day(camera, day, is_back=True, drop_out_of_scope=True)
+        archive_dir, dir_back, dir_front = config.ARCHIVE_DIR, config.dir_back, config.dir_front
+        with tempfile.TemporaryDirectory() as tmp:
+            config.ARCHIVE_DIR = f"{tmp}/archive"
+            try:
+                source_bytes, archive_bytes = archive_export.export_archive(fish_ids=[0])
+                assert source_bytes > 10 * archive_bytes
+                config.INPUT_BACKEND = "archive"
+                keys_a, batches_a = utile.csv_of_the_day(camera, day, is_back=True, drop_out_of_scope=True)
+                assert keys_a == keys
+                for a, b in zip(batches_a, batches):
+                    assert a.equals(b)
+                # the restored csv files hold the same values
+                config.INPUT_BACKEND = "csv"
+                config.dir_back, config.dir_front = f"{tmp}/back", f"{tmp}/front"
+                assert archive_export.import_archive() > 0
+                restored = sorted(glob.glob(f"{tmp}/back/*/*/*.csv"))[0]
+                original = f"{dir_back}/{os.path.relpath(restored, config.dir_back)}"
+                for a, b in zip(
+                    utile.read_batch_arrays(restored, columns=archive.ARCHIVE_COLUMNS)[0],
+                    utile.read_batch_arrays(original, columns=archive.ARCHIVE_COLUMNS)[0],
+                ):
+                    assert np.array_equal(a, b)
+            finally:
+                config.INPUT_BACKEND = "csv"
+                config.ARCHIVE_DIR, config.dir_back, config.dir_front = archive_dir, dir_back, dir_front
+
+    def test_distance_grid(self):
+        area = np.array([[100, 100], [900, 120], [880, 700], [120, 650]], dtype=float)
+        data = np.random.default_rng(0).uniform(0, 1000, size=(5000, 2))
+        data[0] = [5000, 5000]  # outside of the grid
+        config_data, grid = config.CONFIG_DATA, config.DISTANCE_GRID
+        with tempfile.TemporaryDirectory() as tmp:
+            config.CONFIG_DATA = tmp
+            try:
+                config.DISTANCE_GRID = 0
+                exact = distance_grid.wall_distance(data, "test_front", area)
+                config.DISTANCE_GRID = 1
+                approx = distance_grid.wall_distance(data, "test_front", area)
+                assert os.path.exists(distance_grid.get_distance_grid_filename("test_front"))
+                assert approx[0] == exact[0]
+                assert np.allclose(approx, exact, atol=config.DISTANCE_GRID_RESOLUTION)
+                grid, origin = distance_grid.get_distance_grid("test_front", area)
+                inside = grid[tuple(((area.mean(axis=0) - origin) // config.DISTANCE_GRID_RESOLUTION).astype(int))]
+                assert inside > 0 and grid[0, 0] < 0
+                select = np.zeros(len(data), dtype=bool)
+                select[:10] = True
+                dists = distance_grid.wall_distance(data, "test_front", area, select=select)
+                assert np.allclose(dists[:10], approx[:10]) and np.all(np.isnan(dists[10:]))
+                signed = distance_grid.signed_wall_distance(data, "test_front", area)
+                on_grid = np.isfinite(signed)
+                assert not on_grid[0] and np.all(signed[~on_grid] == -np.inf)
+                assert np.array_equal(np.abs(signed[on_grid]), approx[on_grid])
+                from fishproviz.utils.error_filter import error_points_out_of_area
+
+                flt = error_points_out_of_area(data, ("test_front", area))
+                assert flt[0] and np.array_equal(flt[1:], signed[1:] < -config.THRESHOLD_AREA_PX)
+            finally:
+                config.CONFIG_DATA, config.DISTANCE_GRID = config_data, grid
+
+    def test_dirt_points(self):
+        from fishproviz.utils.error_filter import error_dirt_points
+
+        data = np.column_stack([np.arange(100, dtype=float), np.zeros(100) + 5])
+        data[10:25] = data[10]  # dirt sequence of 15 points
+        data[40:44] = data[40]  # too short
+        data[80:100] = 0  # default points are filtered but not logged
+        err_file = config.err_file
+        with tempfile.TemporaryDirectory() as tmp:
+            config.err_file = f"{tmp}/log_error.csv"
+            try:
+                flt = error_dirt_points(data, threshold=10, fish_key="k", day="d")
+                with open(config.err_file) as f:
+                    lines = f.read().splitlines()
+            finally:
+                config.err_file = err_file
+        expected = np.zeros(100, dtype=bool)
+        expected[10:25] = expected[80:100] = True
+        assert np.array_equal(flt, expected)
+        assert lines == ["k;d;0.05;10.0;5.0;10;25"]
+
+    def test_geometry_registry(self):
+        loads = []
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = f"{tmp}/geometry.json"
+            with open(filename, "w") as f:
+                f.write("1")
+
+            def load():
+                loads.append(filename)
+                return len(loads)
+
+            assert geometry.get_entry("test", [filename], load) == 1
+            derived = geometry.get_derived(("test", 0), lambda: [len(loads)])
+            assert geometry.get_entry("test", [filename], load) == 1
+            assert geometry.get_derived(("test", 0), list) is derived
+            state = geometry.registry_state()
+            stat = os.stat(filename)
+            os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            assert geometry.get_entry("test", [filename], load) == 2
+            assert geometry.get_derived(("test", 0), list) == []  # cleared by the reload
+            geometry.restore_registry(state)  # as in a worker process
+            assert geometry.registry_state()["test"][1] == 1
+        geometry.clear_registry()
+
+    def test_worker_config(self):
+        import multiprocessing as mp
+
+        load_threads = config.LOAD_THREADS
+        config.LOAD_THREADS = load_threads + 3  # set at runtime, e.g. from the command line
+        try:
+            # spawned workers import the configuration again instead of inheriting it
+            with mp.get_context("spawn").Pool(
+                1, initializer=utile.init_worker, initargs=utile.worker_initargs()
+            ) as pool:
+                state = pool.apply(config.config_state)
+        finally:
+            config.LOAD_THREADS = load_threads
+        assert state["LOAD_THREADS"] == load_threads + 3
+        assert state["CACHE_DIR"] == config.CACHE_DIR and state["err_file"] == config.err_file
+
+    def test_config_snapshot(self):
+        names = ["FPV_TEST_A", "FPV_TEST_B"]
+        with tempfile.TemporaryDirectory() as tmp:
+            env_file, snapshot_file = f"{tmp}/config.env", f"{tmp}/config.env.snapshot.json"
+            with open(env_file, "w") as f:
+                f.write("FPV_TEST_A=1\nFPV_TEST_B=$((FPV_TEST_A + 1))\n")
+            try:
+                config.load_config_env(env_file, snapshot_file)
+                assert [os.environ[n] for n in names] == ["1", "2"]
+                with open(snapshot_file) as f:
+                    snapshot = json.load(f)
+                assert snapshot["variables"] == {"FPV_TEST_A": "1", "FPV_TEST_B": "2"}
+                # the next import takes the variables from the snapshot
+                snapshot["variables"]["FPV_TEST_B"] = "snapshot"
+                with open(snapshot_file, "w") as f:
+                    json.dump(snapshot, f)
+                for n in names:
+                    del os.environ[n]
+                config.load_config_env(env_file, snapshot_file)
+                assert os.environ["FPV_TEST_B"] == "snapshot"
+                # a changed config.env is sourced again
+                with open(env_file, "a") as f:
+                    f.write("FPV_TEST_B=3\n")
+                del os.environ["FPV_TEST_B"]
+                config.load_config_env(env_file, snapshot_file)
+                assert os.environ["FPV_TEST_B"] == "3"
+                with open(env_file, "a") as f:
+                    f.write("FPV_TEST_C=$(date)\n")
+                assert config.get_env_key(env_file) is None
+                # a variable set on the first run is still in the snapshot of the next run
+                os.remove(snapshot_file)
+                with open(env_file, "w") as f:
+                    f.write("FPV_TEST_A=1\nFPV_TEST_B=2\n")
+                os.environ["FPV_TEST_A"] = "5"
+                config.load_config_env(env_file, snapshot_file)
+                assert os.environ["FPV_TEST_A"] == "5"
+                for n in names:
+                    del os.environ[n]
+                config.load_config_env(env_file, snapshot_file)
+                assert [os.environ[n] for n in names] == ["1", "2"]
+                with open(snapshot_file) as f:
+                    assert "PATH" not in json.load(f)["variables"]
+            finally:
+                for n in names + ["FPV_TEST_C"]:
+                    os.environ.pop(n, None)
+
+    def test_transform(self):
+        pixels = np.random.default_rng(0).uniform(0, 1000, size=(1000, 2))
+        origin, scale = np.array([120.0, 480.0]), 14.5
+        R = transformation.rotation(np.pi / 4)
+        expected = (pixels - origin) @ R @ np.diag([scale, scale])
+        transform = transformation.CoordinateTransform(origin, scale)
+        assert np.array_equal(transform.to_cm(pixels), expected)
+        select = pixels[:, 0] > 500
+        assert np.array_equal(transform.to_cm(pixels, select=select), expected[select])
+        inplace = pixels.copy()
+        assert transform.to_cm(inplace, out=inplace) is inplace
+        assert np.array_equal(inplace, expected)
+        # a changed calibration file is loaded again with the transforms built from it
+        key = "23520264_front"
+        config_data = config.CONFIG_DATA
+        with tempfile.TemporaryDirectory() as tmp:
+            config.CONFIG_DATA = tmp
+            try:
+                for scale in [10.0, 20.0]:
+                    with open(f"{tmp}/calibration.json", "w") as f:
+                        json.dump({"23520264": scale}, f)
+                    os.utime(f"{tmp}/calibration.json", ns=(0, int(scale)))
+                    assert transformation.get_transform(key).scale == scale
+            finally:
+                config.CONFIG_DATA = config_data
+                geometry.clear_registry()
+
+
+if __name__ == "__main__":
+    unittest.main()